@@ -0,0 +1,90 @@
+"""asyncio entry point: python async_bot.py
+
+Updates are received and dispatched by AsyncTeleBot on the event loop.
+The managers keep their synchronous code and talk to Telegram through a plain
+TeleBot API client. Their handlers run on a small thread pool, and the
+yt-dlp/ffmpeg work itself goes to the MediaJobScheduler workers, so a handful
+of downloads can never occupy the threads that answer /q or inline queries.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import telebot
+from telebot.async_telebot import AsyncTeleBot
+
+from config import Config
+from database import Database
+from rate_limiter import RateLimiter
+from http_session import TelegramSessions
+from handlers import BotHandlers
+
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('bot.log'),
+        logging.StreamHandler()
+    ]
+)
+
+# Receives updates on the event loop
+bot = AsyncTeleBot(Config.BOT_TOKEN)
+
+# Blocking API client used by the managers from worker threads
+api_bot = telebot.TeleBot(Config.BOT_TOKEN, threaded=False)
+
+# Shared keep-alive sessions for the managers' calls: control calls don't queue behind uploads
+http_sessions = TelegramSessions().install()
+
+# Throttles the managers' (synchronous) API calls and retries after a 429
+rate_limiter = RateLimiter().install()
+
+# The same handlers as bot.py, bound to the blocking client
+handlers = BotHandlers(api_bot)
+router = handlers.router
+maintenance_job = handlers.maintenance_job
+
+light_executor = ThreadPoolExecutor(max_workers=Config.LIGHT_WORKERS, thread_name_prefix='light')
+
+
+async def run_light(func, *args, **kwargs):
+    """Run a quick blocking handler (DB + one API call) off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(light_executor, functools.partial(func, *args, **kwargs))
+
+
+@bot.message_handler(func=router.matches)
+async def route_message(message):
+    await run_light(router.dispatch, message)
+
+@bot.callback_query_handler(func=lambda call: True)
+async def handle_callback_query(call):
+    await run_light(handlers.handle_callback_query, call)
+
+@bot.inline_handler(handlers.is_quotes_query)
+async def handle_inline_quotes(query):
+    await run_light(handlers.handle_inline_quotes, query)
+
+@bot.inline_handler(handlers.is_photos_query)
+async def handle_inline_photos(query):
+    await run_light(handlers.handle_inline_photos, query)
+
+
+async def main():
+    logging.info("Starting PororokzBot (asyncio)...")
+    maintenance_job.start()
+    try:
+        await bot.infinity_polling()
+    finally:
+        await bot.close_session()
+        light_executor.shutdown(wait=True)
+        handlers.shutdown(wait=False)
+        Database.shared().close()
+        http_sessions.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
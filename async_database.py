@@ -0,0 +1,40 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from database import Database
+
+
+class AsyncDatabase:
+    """Awaitable facade over Database; every call runs on a dedicated DB executor
+
+    Usage from asyncio code: ``quote_id = await adb.add_quote(...)``.
+    """
+
+    def __init__(self, db=None, max_workers=None):
+        self.db = db or Database.shared()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.DB_POOL_SIZE,
+            thread_name_prefix='db'
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, method)
+        return method
+
+    async def close(self):
+        """Flush pending writes, close connections and stop the executor"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.db.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,41 @@
+# How audio is produced for send_audio. Telegram plays MP3 and M4A (AAC).
+#
+# native — pick an m4a/mp3 stream when the site has one and send it as is;
+#          AAC in another container (TikTok mp4) is remuxed with a stream copy;
+#          anything else (opus/webm) falls back to a 192 kbps MP3 transcode
+# mp3    — always transcode to 192 kbps MP3 (slowest, the old behaviour)
+AUDIO_MODES = ('native', 'mp3')
+
+NATIVE_AUDIO_FORMAT = 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best'
+
+# FFmpegExtractAudio "source ext > target" mapping; the last item is the default
+NATIVE_AUDIO_MAPPING = 'm4a>m4a/mp3>mp3/mp4>m4a/mp3'
+
+
+def audio_options(mode):
+    """yt-dlp 'format' and 'postprocessors' options for an audio delivery mode"""
+    if mode not in AUDIO_MODES:
+        raise ValueError(f"Unknown audio mode: {mode}")
+    if mode == 'mp3':
+        return {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        }
+    return {
+        'format': NATIVE_AUDIO_FORMAT,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': NATIVE_AUDIO_MAPPING,
+            'preferredquality': '192',  # only used by the MP3 fallback
+        }],
+    }
+
+
+def downloaded_path(info):
+    """Final path of a file from extract_info(download=True), after post-processing"""
+    downloads = (info or {}).get('requested_downloads') or [{}]
+    return downloads[0].get('filepath')
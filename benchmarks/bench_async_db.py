@@ -0,0 +1,69 @@
+"""Compare blocking Database calls with AsyncDatabase inside an asyncio loop.
+
+Besides throughput it reports event-loop lag: how late a 1 ms heartbeat task
+wakes up while the database work is running. Blocking calls made directly on
+the loop stall it; awaited calls keep it responsive.
+
+    python benchmarks/bench_async_db.py [operations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_database import AsyncDatabase
+from database import Database
+
+
+async def heartbeat(stop, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def run_sync(db, operations):
+    for i in range(operations):
+        db.add_quote(i % 50, i % 7, f"benchmark quote {i}", "bench")
+        db.get_user_quotes(i % 50, limit=10)
+
+
+async def run_async(adb, operations, concurrency=16):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await adb.add_quote(i % 50, i % 7, f"benchmark quote {i}", "bench")
+            await adb.get_user_quotes(i % 50, limit=10)
+
+    await asyncio.gather(*(one(i) for i in range(operations)))
+
+
+async def measure(name, work):
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await work
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    worst = max(lags) * 1000 if lags else 0.0
+    print(f"{name:>6}: {elapsed:.3f}s total, {len(lags)} heartbeats, worst loop lag {worst:.1f} ms")
+
+
+async def main(operations):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        adb = AsyncDatabase(db)
+        await measure('sync', run_sync(db, operations))
+        await measure('async', run_async(adb, operations))
+        await adb.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,76 @@
+"""CPU-seconds of ffmpeg per delivered track for each audio mode.
+
+Generates test sources of the kinds YouTube and TikTok serve (AAC in m4a,
+AAC inside an mp4 video, Opus in webm) and runs yt-dlp's FFmpegExtractAudio
+on each with the options from audio_policy.audio_options(). CPU time is
+taken from the ffmpeg/ffprobe child processes. Needs ffmpeg on PATH.
+
+    python benchmarks/bench_audio_policy.py [seconds of audio]
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
+
+from audio_policy import AUDIO_MODES, audio_options
+
+# source ext -> (extra ffmpeg inputs, output options)
+SOURCES = {
+    'm4a': ([], ['-c:a', 'aac', '-b:a', '128k']),
+    'mp4': (['-f', 'lavfi', '-i', 'color=c=black:s=320x240:r=25'],
+            ['-shortest', '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-b:a', '128k']),
+    'webm': ([], ['-c:a', 'libopus', '-b:a', '128k']),
+}
+
+
+def make_source(directory, ext, seconds):
+    path = os.path.join(directory, f'source.{ext}')
+    inputs, output = SOURCES[ext]
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         *inputs, *output, path],
+        check=True
+    )
+    return path
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def deliver(ydl, mode, source, workdir):
+    options = audio_options(mode)['postprocessors'][0]
+    ext = os.path.splitext(source)[1][1:]
+    path = os.path.join(workdir, f'track.{ext}')
+    shutil.copy(source, path)
+
+    pp = FFmpegExtractAudioPP(ydl, options['preferredcodec'], options['preferredquality'])
+    cpu, wall = children_cpu(), time.perf_counter()
+    _, info = pp.run({'filepath': path, 'ext': ext})
+    cpu, wall = children_cpu() - cpu, time.perf_counter() - wall
+
+    size = os.path.getsize(info['filepath'])
+    for name in os.listdir(workdir):
+        os.remove(os.path.join(workdir, name))
+    return info['ext'], cpu, wall, size
+
+
+if __name__ == '__main__':
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 180
+    with tempfile.TemporaryDirectory() as sources, tempfile.TemporaryDirectory() as workdir:
+        paths = {ext: make_source(sources, ext, seconds) for ext in SOURCES}
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            print(f"{'mode':<7} {'source':<6} {'sent as':<8} {'cpu s':>7} {'wall s':>7} {'KB':>7}")
+            for mode in AUDIO_MODES:
+                for ext, path in paths.items():
+                    out_ext, cpu, wall, size = deliver(ydl, mode, path, workdir)
+                    print(f"{mode:<7} {ext:<6} {out_ext:<8} {cpu:>7.2f} {wall:>7.2f} {size // 1024:>7}")
@@ -0,0 +1,85 @@
+"""Per-request yt-dlp setup cost: a fresh YoutubeDL per call vs ExtractorPool.
+
+Serves a small m4a-typed file from a local HTTP server and resolves it with
+extract_info(download=False) through the 'music-audio' profile, so the
+numbers are setup (options, cookie file, extractor instances, HTTP
+handlers) plus one cheap generic extraction, with no network noise. The
+cookie file holds as many cookies as a typical exported YouTube session.
+
+    python benchmarks/bench_extractors.py [requests]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+
+from extractors import PROFILES, ExtractorPool
+
+BODY = b'\x00\x00\x00\x20ftypM4A ' + b'\x00' * 4096
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    do_HEAD = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+def write_cookies(path, count=60):
+    with open(path, 'w') as f:
+        f.write('# Netscape HTTP Cookie File\n')
+        for i in range(count):
+            f.write(f'.youtube.com\tTRUE\t/\tTRUE\t2000000000\tCOOKIE{i}\t{"x" * 100}\n')
+
+
+def fresh(url, profile):
+    params = {'quiet': True, 'no_warnings': True, **profile}
+    with yt_dlp.YoutubeDL(params) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def pooled(url, pool):
+    with pool.acquire('music-audio') as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def timed(requests, call):
+    started = time.perf_counter()
+    for _ in range(requests):
+        call()
+    return (time.perf_counter() - started) / requests * 1000
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/track.m4a'
+
+    with tempfile.TemporaryDirectory() as directory:
+        cookiefile = os.path.join(directory, 'cookies.txt')
+        write_cookies(cookiefile)
+        profile = {**PROFILES['music-audio'], 'cookiefile': cookiefile}
+        pool = ExtractorPool({'music-audio': profile}, size=1)
+
+        fresh(url, profile)  # warm imports and the OS page cache for both runs
+        pooled(url, pool)
+        print(f"{'setup':<22} {'ms/request':>10}")
+        print(f"{'fresh YoutubeDL':<22} {timed(requests, lambda: fresh(url, profile)):>10.2f}")
+        print(f"{'ExtractorPool':<22} {timed(requests, lambda: pooled(url, pool)):>10.2f}")
+        print(pool.stats())
+        pool.close()
+    server.shutdown()
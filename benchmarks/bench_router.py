@@ -0,0 +1,102 @@
+"""Messages per second through the text-message filter chain.
+
+Compares the original registration (one TeleBot handler per command list
+plus lambda filters for "муз ..." and TikTok links) with the single
+MessageRouter handler. Both bots run the real TeleBot dispatcher with
+no-op handlers on a mix that is mostly ordinary group chatter.
+
+    python benchmarks/bench_router.py [messages]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot
+from telebot import types
+
+from router import MessageRouter
+
+COMMANDS = [
+    ['start', 'help'], ['quote', 'q'], ['quote2', 'q2'], ['my_quote', 'm_q'], ['her_quote', 'h_q'],
+    ['chat_quote', 'c_q'], ['mchat_quote', 'mc_q'], ['all_quote'], ['delete_quote', 'd_q'], ['myz'],
+    ['save_photo', 'save_scan'], ['photos', 'scans'], ['tiktok'], ['recount'], ['maintenance'],
+]
+
+OLD_TIKTOK_PATTERNS = [
+    r'https?://(?:www\.)?tiktok\.com/@[\w\.-]+/video/\d+',
+    r'https?://vm\.tiktok\.com/[\w\d]+',
+    r'https?://(?:www\.)?tiktok\.com/t/[\w\d]+',
+]
+
+
+def old_is_tiktok_url(text):
+    for pattern in OLD_TIKTOK_PATTERNS:
+        if re.search(pattern, text):
+            return True
+    return False
+
+
+def make_messages(count):
+    chatter = [
+        "ну и что дальше", "кто идет вечером?", "ахахах", "https://example.com/some/page",
+        "завтра в 10 встречаемся у входа, не опаздывайте пожалуйста", "ok", "👍",
+        "я видел это видео вчера, очень смешно",
+    ]
+    messages = []
+    for i in range(count):
+        roll = random.random()
+        if roll < 0.03:
+            text = random.choice(['/q', '/m_q 3', '/c_q', '/myz song'])
+        elif roll < 0.04:
+            text = 'муз Ерке Есмахан'
+        elif roll < 0.05:
+            text = 'смотри https://vm.tiktok.com/ZMabc123/'
+        else:
+            text = random.choice(chatter)
+        messages.append(types.Message.de_json({
+            'message_id': i, 'date': 0, 'text': text,
+            'chat': {'id': -100, 'type': 'group'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'x'},
+        }))
+    return messages
+
+
+def old_bot():
+    bot = telebot.TeleBot('1:FAKE', threaded=False)
+    for names in COMMANDS:
+        bot.message_handler(commands=names)(lambda message: None)
+    bot.message_handler(func=lambda message: message.text.lower().startswith('муз '))(lambda message: None)
+    bot.message_handler(func=lambda message: old_is_tiktok_url(message.text or ''))(lambda message: None)
+    return bot
+
+
+def new_bot():
+    bot = telebot.TeleBot('1:FAKE', threaded=False)
+    router = MessageRouter()
+    for names in COMMANDS:
+        router.command(*names)(lambda message: None)
+    router.on('music_text')(lambda message: None)
+    router.on('tiktok_url')(lambda message: None)
+    bot.message_handler(func=router.matches)(router.dispatch)
+    return bot
+
+
+def measure(name, bot, messages):
+    started = time.perf_counter()
+    for message in messages:
+        # Fresh route cache per run, as for a newly received update
+        message.__dict__.pop('_route', None)
+        bot.process_new_messages([message])
+    elapsed = time.perf_counter() - started
+    print(f"{name:>7}: {len(messages) / elapsed:,.0f} messages/s")
+
+
+if __name__ == '__main__':
+    random.seed(1)
+    messages = make_messages(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
+    measure('filters', old_bot(), messages)
+    measure('router', new_bot(), messages)
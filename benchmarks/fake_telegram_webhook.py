@@ -0,0 +1,89 @@
+"""Exercise the webhook server offline, the way Telegram would call it.
+
+Starts WebhookServer on a free local port with a real TeleBot dispatcher
+(fake token, handlers that only record), then POSTs synthetic updates and
+reports delivery latency. It also checks the health endpoint and that a
+wrong secret token is rejected.
+
+    python benchmarks/fake_telegram_webhook.py [updates]
+"""
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot
+from telebot import types
+
+from webhook import WebhookServer
+
+SECRET = 'fake-secret'
+
+
+def make_update(update_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': -100, 'type': 'group', 'title': 'fake'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Fake'},
+            'text': text,
+        },
+    }
+
+
+def post(url, body, secret=SECRET):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method='POST')
+    request.add_header('Content-Type', 'application/json')
+    request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main(count):
+    bot = telebot.TeleBot('123456:FAKE', threaded=False)
+    received = []
+    done = threading.Event()
+
+    @bot.message_handler(func=lambda message: True)
+    def record(message):
+        received.append((message.message_id, time.perf_counter()))
+        if len(received) == count:
+            done.set()
+
+    server = WebhookServer(
+        lambda update: bot.process_new_updates([types.Update.de_json(update)]),
+        SECRET, host='127.0.0.1', port=0
+    )
+    server.start()
+    base = f'http://127.0.0.1:{server.port}'
+    try:
+        assert post(base + server.path, make_update(0, 'x'), secret='wrong') == 403, "bad secret accepted"
+        with urllib.request.urlopen(base + '/health') as response:
+            print('health:', json.loads(response.read()))
+
+        sent = {}
+        for i in range(1, count + 1):
+            sent[i] = time.perf_counter()
+            assert post(base + server.path, make_update(i, f'hello {i}')) == 200
+        done.wait(10)
+
+        latencies = sorted((received_at - sent[i]) * 1000 for i, received_at in received)
+        print(f"delivered {len(received)}/{count} updates")
+        print(f"latency p50 {latencies[len(latencies) // 2]:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
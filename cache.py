@@ -0,0 +1,157 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Rough size in bytes of a cached value (rows, lists, strings)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return size
+
+
+class LRUCache:
+    """Thread-safe LRU cache with TTL, entry and byte limits and tag invalidation"""
+
+    def __init__(self, max_entries=1000, max_bytes=8 * 1024 * 1024, ttl=300, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # key -> (value, size, expires_at, tags)
+        self._tags = {}  # tag -> set of keys
+        self._generations = {}  # tag -> invalidation counter, only while a load uses the tag
+        self._loading = {}  # tag -> number of get_or_load() calls in flight
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=(), ttl=None, generations=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            # A tag was invalidated while the value was being loaded: it may be stale
+            if generations is not None and generations != self._tag_generations(tags):
+                return
+            if key in self._data:
+                self._remove(key, evicted=False)
+            self._data[key] = (value, size, expires_at, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def get_or_load(self, key, loader, tags=()):
+        """Read-through: return cached value or call loader() and cache its result"""
+        with self._lock:
+            for tag in tags:
+                self._loading[tag] = self._loading.get(tag, 0) + 1
+            generations = self._tag_generations(tags)
+        try:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                value = loader()
+                self.set(key, value, tags, generations=generations)
+            return value
+        finally:
+            with self._lock:
+                for tag in tags:
+                    self._loading[tag] -= 1
+                    if not self._loading[tag]:
+                        # Nobody can compare against it any more: keeps the dict bounded
+                        del self._loading[tag]
+                        self._generations.pop(tag, None)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._remove(key, evicted=False)
+            return entry[0]
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key, evicted=False)
+
+    def invalidate_tag(self, tag):
+        """Drop every entry stored with this tag"""
+        with self._lock:
+            # Only loads in flight need to notice; otherwise nothing is remembered
+            if tag in self._loading:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key, evicted=False)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key, evicted=False)
+
+    def purge_expired(self):
+        """Drop expired entries; returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry[2] < now]
+            for key in expired:
+                self._remove(key)
+            return len(expired)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+    def _tag_generations(self, tags):
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def _remove(self, key, evicted=True):
+        value, size, _, tags = self._data.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        if evicted:
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(key, value)
+
+
+_MISSING = object()
@@ -13,7 +13,102 @@ class Config:
     # API Keys (optional)
     SHAZAM_API_KEY = os.getenv('SHAZAM_API_KEY', '')
     
+    # Admins (comma-separated Telegram user ids) for maintenance commands
+    ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
+    
     # Bot settings
     MAX_QUOTES_PER_USER = 100
     MAX_PHOTOS_PER_USER = 50
-    MAX_MUSIC_PER_USER = 30
\ No newline at end of file
+    MAX_MUSIC_PER_USER = 30
+
+    # Database connection pool (shared by all managers and worker threads)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+    DB_BUSY_TIMEOUT = 10  # seconds
+    DB_SYNCHRONOUS = 'NORMAL'  # safe with WAL, one fsync per checkpoint
+    DB_CACHE_SIZE = -16000  # negative = KiB, i.e. 16 MB page cache
+    DB_MMAP_SIZE = 64 * 1024 * 1024
+    
+    # Write-behind: batch inserts from all handlers into one commit
+    DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', '0') == '1'
+    DB_WRITE_BATCH_SIZE = 100  # rows per transaction at most
+    DB_WRITE_FLUSH_MS = int(os.getenv('DB_WRITE_FLUSH_MS', '0'))  # extra linger to grow batches
+    
+    # In-process cache of quote pages and formatted quote texts
+    QUOTE_CACHE_ENTRIES = 2000
+    QUOTE_CACHE_BYTES = 16 * 1024 * 1024
+    QUOTE_CACHE_TTL = 600  # seconds
+    
+    # Scheduled maintenance: hot backups, retention, incremental vacuum, ANALYZE
+    MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', '24'))  # 0 = off
+    BACKUP_DIR = 'backups'
+    BACKUP_KEEP = 3
+    BACKUP_PAGES_PER_STEP = 1024
+    RETENTION_DAYS = {  # table -> days to keep, None = forever
+        'music': 90,
+        'tiktok_videos': 90,
+    }
+    
+    # Worker pools: heavy yt-dlp/ffmpeg jobs are kept apart from light commands
+    MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', str(min(4, os.cpu_count() or 1))))
+    LIGHT_WORKERS = int(os.getenv('LIGHT_WORKERS', '8'))
+    
+    # Media job queue (yt-dlp / ffmpeg work)
+    MEDIA_QUEUE_SIZE = 50  # queued jobs across all users
+    MEDIA_PER_USER_QUEUED = 3
+    MEDIA_PER_USER_RUNNING = 1
+    
+    # Update delivery: 'polling' or 'webhook' (embedded HTTP server)
+    BOT_MODE = os.getenv('BOT_MODE', 'polling')
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL', os.getenv('RENDER_EXTERNAL_URL', ''))  # public base URL
+    WEBHOOK_PATH = '/telegram/webhook'
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # random per start when empty
+    WEBHOOK_HOST = '0.0.0.0'
+    PORT = int(os.getenv('PORT', '8080'))
+    
+    # Outbound Telegram API limits (https://core.telegram.org/bots/faq#broadcasting-to-users)
+    RATE_GLOBAL_PER_SEC = 30
+    RATE_GROUP_PER_MIN = 20
+    RATE_GROUP_BURST = 5
+    RATE_PRIVATE_PER_SEC = 1
+    RATE_PRIVATE_BURST = 3
+    RATE_MAX_RETRIES = 3  # retries after a 429, each waiting retry_after
+    
+    # /photos gallery: one media group per page
+    PHOTOS_PAGE_SIZE = 10  # Telegram allows at most 10 items per media group
+    
+    # Bot API HTTP: shared keep-alive sessions, small calls apart from uploads
+    BOT_WORKERS = int(os.getenv('BOT_WORKERS', '4'))  # TeleBot handler threads (polling/webhook)
+    HTTP_CONNECT_TIMEOUT = 5  # seconds
+    HTTP_UPLOAD_TIMEOUT = 300  # read timeout for send_audio/send_video/download_file
+    HTTP_RETRIES = 2  # extra attempts for idempotent methods (get*, webhook setup)
+    
+    # Music search cache (SQLite): normalized query + depth -> compact results
+    MUSIC_SEARCH_CACHE_TTL = 3 * 24 * 3600  # seconds
+    MUSIC_SEARCH_CACHE_ENTRIES = 5000
+    
+    # Pending music search menus (in memory): who may pick, and what
+    MUSIC_SESSION_TTL = 15 * 60  # seconds a menu stays usable
+    MUSIC_SESSION_ENTRIES = 5000
+    MUSIC_SESSION_BYTES = 8 * 1024 * 1024
+    
+    # Audio delivery per manager: 'native' (m4a as is / remux, MP3 only as fallback) or 'mp3'
+    MUSIC_AUDIO_MODE = os.getenv('MUSIC_AUDIO_MODE', 'native')
+    TIKTOK_AUDIO_MODE = os.getenv('TIKTOK_AUDIO_MODE', 'native')
+    
+    # Download -> upload pipeline: media is buffered in memory up to MEDIA_SPOOL_BYTES, then in an anonymous temp file
+    MEDIA_SPOOL_BYTES = int(os.getenv('MEDIA_SPOOL_BYTES', str(32 * 1024 * 1024)))
+    MEDIA_CHUNK_BYTES = 10 * 1024 * 1024  # Range request size for progressive streams
+    
+    # Warm yt-dlp instances (extractors.py): idle ones kept per option profile
+    EXTRACTOR_POOL_SIZE = MEDIA_WORKERS
+    COOKIES_FILE = os.getenv('COOKIES_FILE', 'cookies.txt')  # YouTube cookies, loaded once and shared
+    
+    # Speculative prefetch while a music menu is on screen: 'off', 'resolve' (stream URLs) or 'download' (also buffer the audio)
+    PREFETCH_MODE = os.getenv('PREFETCH_MODE', 'off')
+    PREFETCH_TOP = 2  # first menu entries to prefetch
+    PREFETCH_PER_CHAT = 2  # entries held or in flight per chat
+    PREFETCH_MENUS = 20  # menus with prefetches at once; the oldest is dropped first
+    PREFETCH_WORKERS = 2
+    PREFETCH_MAX_BYTES = 20 * 1024 * 1024  # bigger sources are only resolved
+    PREFETCH_TOTAL_BYTES = int(os.getenv('PREFETCH_TOTAL_BYTES', str(64 * 1024 * 1024)))  # all buffered audio; oldest released first
+    PREFETCH_SPOOL_BYTES = 1024 * 1024  # per track in memory, the rest in an anonymous temp file
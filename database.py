@@ -1,72 +1,225 @@
 import sqlite3
 import logging
+import atexit
+import json
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from config import Config
+from cache import LRUCache
+from migrations import apply_migrations, RECOUNT_USAGE_SQL, USAGE_TABLES
+from write_behind import WriteBehindQueue
+
+# Quote rows as the managers unpack them (the table also has the ordinal columns)
+QUOTE_COLUMNS = 'id, user_id, chat_id, message_text, author_name, author_id, quote_type, created_at'
+
+# Ordinal column kept by triggers (migration 7) for each quote owner column
+QUOTE_SEQ_COLUMNS = {'user_id': 'user_seq', 'chat_id': 'chat_seq'}
+
+# How many exact rowid probes to try before falling back to "next row after"
+RANDOM_PROBES = 4
+
+
+class ConnectionPool:
+    """Thread-safe pool of persistent SQLite connections in WAL mode"""
+
+    def __init__(self, db_path, size=None):
+        self.db_path = db_path
+        self.size = size or Config.DB_POOL_SIZE
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        """Open a connection and apply tuned pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=Config.DB_BUSY_TIMEOUT,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size={int(Config.DB_CACHE_SIZE)}')
+        conn.execute(f'PRAGMA mmap_size={int(Config.DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=Config.DB_BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a pooled connection")
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        """Close all idle connections; busy ones are closed on release"""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
 
 class Database:
-    def __init__(self):
-        self.db_path = Config.DATABASE_PATH
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or Config.DATABASE_PATH
+        self.pool = ConnectionPool(self.db_path)
         self.init_database()
+        
+        # Hot per-user / per-chat quote pages, invalidated on add/delete
+        self.quote_cache = LRUCache(
+            max_entries=Config.QUOTE_CACHE_ENTRIES,
+            max_bytes=Config.QUOTE_CACHE_BYTES,
+            ttl=Config.QUOTE_CACHE_TTL
+        )
+        
+        # Optional group commit of inserts on a background thread
+        self.writer = None
+        if Config.DB_WRITE_BEHIND:
+            self.writer = WriteBehindQueue(self.pool)
+            atexit.register(self.writer.close)
+
+    @classmethod
+    def shared(cls):
+        """Process-wide instance used by all managers and worker threads"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    def close(self):
+        """Flush pending writes and close pooled connections"""
+        if self.writer:
+            self.writer.close()
+        self.pool.close()
+    
+    def _insert(self, query, params):
+        """Run an INSERT and return the new row id (group-committed in write-behind mode)"""
+        if self.writer:
+            return self.writer.submit(query, params).result()
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).lastrowid
+    
+    def _select_quotes(self, column, value, limit=None):
+        """Newest-first quotes where column = value"""
+        with self.pool.connection() as conn:
+            query = f'SELECT {QUOTE_COLUMNS} FROM quotes WHERE {column} = ? ORDER BY created_at DESC, id DESC'
+            if limit:
+                query += f' LIMIT {int(limit)}'
+            return conn.execute(query, (value,)).fetchall()
+    
+    def _fts_query(self, terms):
+        """Turn free text into an FTS5 query: every word must match as a prefix"""
+        words = re.findall(r'\w+', terms or '')
+        return ' '.join(f'"{word}"*' for word in words)
+    
+    def _invalidate_quotes(self, user_id, chat_id):
+        """Drop cached quote pages for this user and chat"""
+        self.quote_cache.invalidate_tag(('user', user_id))
+        self.quote_cache.invalidate_tag(('chat', chat_id))
+    
+    def cache_stats(self):
+        """Hit/miss counters of the quote page cache"""
+        return self.quote_cache.stats()
+    
+    def _random_row(self, conn, table):
+        """Pick a random row by sampling the rowid range instead of ORDER BY RANDOM()"""
+        columns = QUOTE_COLUMNS if table == 'quotes' else '*'
+        # One aggregate per subquery: only then does SQLite read MIN/MAX off the b-tree edges
+        low, high = conn.execute(f'SELECT (SELECT MIN(id) FROM {table}), (SELECT MAX(id) FROM {table})').fetchone()
+        if low is None:
+            return None
+        
+        # Exact probes keep the pick uniform while deleted ids are rare
+        for _ in range(RANDOM_PROBES):
+            row = conn.execute(f'SELECT {columns} FROM {table} WHERE id = ?', (random.randint(low, high),)).fetchone()
+            if row:
+                return row
+        
+        # Many gaps: take the first row at or after a random point
+        return conn.execute(
+            f'SELECT {columns} FROM {table} WHERE id >= ? ORDER BY id LIMIT 1',
+            (random.randint(low, high),)
+        ).fetchone()
+    
+    def _usage(self, conn, user_id, kind):
+        """Primary-key lookup of a usage counter"""
+        if kind not in USAGE_TABLES.values():
+            raise ValueError(f"Unknown usage kind: {kind}")
+        row = conn.execute(f'SELECT {kind} FROM user_usage WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def _quote_total(self, conn, column, value):
+        """Number of quotes where column = value: the highest ordinal, one index seek"""
+        seq = QUOTE_SEQ_COLUMNS[column]
+        return conn.execute(f'SELECT MAX({seq}) FROM quotes WHERE {column} = ?', (value,)).fetchone()[0] or 0
+    
+    def _nth_quote(self, conn, column, value, number, total):
+        """Quote number N (1 = newest) where column = value, looked up by its ordinal"""
+        seq = QUOTE_SEQ_COLUMNS[column]
+        return conn.execute(
+            f'SELECT {QUOTE_COLUMNS} FROM quotes WHERE {column} = ? AND {seq} = ?',
+            (value, total - number + 1)
+        ).fetchone()
+    
+    def _random_quote_where(self, conn, column, value):
+        """Uniformly random quote where column = value: a random ordinal, two index seeks"""
+        total = self._quote_total(conn, column, value)
+        if not total:
+            return None
+        return self._nth_quote(conn, column, value, random.randint(1, total), total)
     
     def init_database(self):
-        """Initialize database tables"""
+        """Initialize database tables and apply pending migrations"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Quotes table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS quotes (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        chat_id INTEGER NOT NULL,
-                        message_text TEXT NOT NULL,
-                        author_name TEXT,
-                        author_id INTEGER,
-                        quote_type INTEGER DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Photos table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS photos (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        file_id TEXT NOT NULL,
-                        description TEXT,
-                        file_path TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Music table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS music (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        title TEXT NOT NULL,
-                        artist TEXT,
-                        file_path TEXT,
-                        file_id TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # TikTok table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS tiktok_videos (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        url TEXT NOT NULL,
-                        file_path TEXT,
-                        title TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                conn.commit()
-                logging.info("Database initialized successfully")
+            with self.pool.connection() as conn:
+                version = apply_migrations(conn)
+                logging.info(f"Database initialized successfully (schema v{version})")
                 
         except sqlite3.Error as e:
             logging.error(f"Database initialization error: {e}")
@@ -74,15 +227,12 @@ class Database:
     def add_quote(self, user_id, chat_id, message_text, author_name=None, author_id=None, quote_type=1):
         """Add a new quote to database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO quotes (user_id, chat_id, message_text, author_name, author_id, quote_type)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, chat_id, message_text, author_name, author_id, quote_type))
-                quote_id = cursor.lastrowid
-                conn.commit()
-                return quote_id
+            quote_id = self._insert('''
+                INSERT INTO quotes (user_id, chat_id, message_text, author_name, author_id, quote_type)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, chat_id, message_text, author_name, author_id, quote_type))
+            self._invalidate_quotes(user_id, chat_id)
+            return quote_id
         except sqlite3.Error as e:
             logging.error(f"Error adding quote: {e}")
             return None
@@ -90,13 +240,11 @@ class Database:
     def get_user_quotes(self, user_id, limit=None):
         """Get quotes by user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                query = 'SELECT * FROM quotes WHERE user_id = ? ORDER BY created_at DESC'
-                if limit:
-                    query += f' LIMIT {limit}'
-                cursor.execute(query, (user_id,))
-                return cursor.fetchall()
+            return self.quote_cache.get_or_load(
+                ('user_quotes', user_id, limit),
+                lambda: self._select_quotes('user_id', user_id, limit),
+                tags=[('user', user_id)]
+            )
         except sqlite3.Error as e:
             logging.error(f"Error getting user quotes: {e}")
             return []
@@ -104,35 +252,143 @@ class Database:
     def get_chat_quotes(self, chat_id, limit=None):
         """Get quotes from specific chat"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            return self.quote_cache.get_or_load(
+                ('chat_quotes', chat_id, limit),
+                lambda: self._select_quotes('chat_id', chat_id, limit),
+                tags=[('chat', chat_id)]
+            )
+        except sqlite3.Error as e:
+            logging.error(f"Error getting chat quotes: {e}")
+            return []
+    
+    def count_user_quotes(self, user_id):
+        """Count quotes saved by user"""
+        try:
+            with self.pool.connection() as conn:
+                return self._usage(conn, user_id, 'quotes')
+        except sqlite3.Error as e:
+            logging.error(f"Error counting user quotes: {e}")
+            return 0
+    
+    def count_chat_quotes(self, chat_id):
+        """Count quotes from specific chat"""
+        try:
+            with self.pool.connection() as conn:
+                return self._quote_total(conn, 'chat_id', chat_id)
+        except sqlite3.Error as e:
+            logging.error(f"Error counting chat quotes: {e}")
+            return 0
+    
+    def get_user_quote_by_number(self, user_id, number):
+        """Get user's N-th quote (1 = newest); returns (quote or None, total count)"""
+        try:
+            with self.pool.connection() as conn:
+                total = self._quote_total(conn, 'user_id', user_id)
+                if number < 1 or number > total:
+                    return None, total
+                return self._nth_quote(conn, 'user_id', user_id, number, total), total
+        except sqlite3.Error as e:
+            logging.error(f"Error getting user quote #{number}: {e}")
+            return None, 0
+    
+    def get_chat_quote_by_number(self, chat_id, number):
+        """Get chat's N-th quote (1 = newest); returns (quote or None, total count)"""
+        try:
+            with self.pool.connection() as conn:
+                total = self._quote_total(conn, 'chat_id', chat_id)
+                if number < 1 or number > total:
+                    return None, total
+                return self._nth_quote(conn, 'chat_id', chat_id, number, total), total
+        except sqlite3.Error as e:
+            logging.error(f"Error getting chat quote #{number}: {e}")
+            return None, 0
+    
+    def search_quotes(self, user_id, terms, limit=10, offset=0):
+        """Full-text search in user's quotes, best matches first"""
+        match = self._fts_query(terms)
+        if not match:
+            return []
+        try:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
-                query = 'SELECT * FROM quotes WHERE chat_id = ? ORDER BY created_at DESC'
-                if limit:
-                    query += f' LIMIT {limit}'
-                cursor.execute(query, (chat_id,))
+                # The owner filter is part of the MATCH: other users' quotes are never ranked.
+                # The search words only look at the text columns, never at the owner id
+                cursor.execute('''
+                    SELECT quotes.id, quotes.user_id, quotes.chat_id, quotes.message_text, quotes.author_name,
+                           quotes.author_id, quotes.quote_type, quotes.created_at
+                    FROM quotes_fts
+                    JOIN quotes ON quotes.id = quotes_fts.rowid
+                    WHERE quotes_fts MATCH ?
+                    ORDER BY bm25(quotes_fts, 1.0, 1.0, 0.0), quotes.id DESC
+                    LIMIT ? OFFSET ?
+                ''', (f'user_id:"{int(user_id)}" AND {{message_text author_name}} : ({match})', limit, offset))
                 return cursor.fetchall()
         except sqlite3.Error as e:
-            logging.error(f"Error getting chat quotes: {e}")
+            logging.error(f"Error searching quotes: {e}")
             return []
     
+    def get_usage(self, user_id, kind):
+        """Stored item count for quota checks ('quotes', 'photos', 'music', 'tiktok')"""
+        try:
+            with self.pool.connection() as conn:
+                return self._usage(conn, user_id, kind)
+        except sqlite3.Error as e:
+            logging.error(f"Error getting {kind} usage: {e}")
+            return 0
+    
+    def recompute_usage(self):
+        """Rebuild usage counters from the tables; returns number of users"""
+        try:
+            with self.pool.connection() as conn:
+                for statement in RECOUNT_USAGE_SQL:
+                    conn.execute(statement)
+                return conn.execute('SELECT COUNT(*) FROM user_usage').fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"Error recomputing usage counters: {e}")
+            return None
+    
     def get_random_quote(self):
         """Get random quote from all quotes"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM quotes ORDER BY RANDOM() LIMIT 1')
-                return cursor.fetchone()
+            with self.pool.connection() as conn:
+                return self._random_row(conn, 'quotes')
         except sqlite3.Error as e:
             logging.error(f"Error getting random quote: {e}")
             return None
     
+    def get_random_user_quote(self, user_id):
+        """Get random quote saved by user"""
+        try:
+            with self.pool.connection() as conn:
+                return self._random_quote_where(conn, 'user_id', user_id)
+        except sqlite3.Error as e:
+            logging.error(f"Error getting random user quote: {e}")
+            return None
+    
+    def get_random_chat_quote(self, chat_id):
+        """Get random quote from specific chat"""
+        try:
+            with self.pool.connection() as conn:
+                return self._random_quote_where(conn, 'chat_id', chat_id)
+        except sqlite3.Error as e:
+            logging.error(f"Error getting random chat quote: {e}")
+            return None
+    
     def delete_quote(self, quote_id, user_id):
         """Delete user's quote"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
+                row = cursor.execute(
+                    'SELECT chat_id FROM quotes WHERE id = ? AND user_id = ?', (quote_id, user_id)
+                ).fetchone()
+                if not row:
+                    return False
                 cursor.execute('DELETE FROM quotes WHERE id = ? AND user_id = ?', (quote_id, user_id))
-                return cursor.rowcount > 0
+                deleted = cursor.rowcount > 0
+            if deleted:
+                self._invalidate_quotes(user_id, row[0])
+            return deleted
         except sqlite3.Error as e:
             logging.error(f"Error deleting quote: {e}")
             return False
@@ -140,14 +396,10 @@ class Database:
     def add_photo(self, user_id, file_id, description=None, file_path=None):
         """Add saved photo"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO photos (user_id, file_id, description, file_path)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, file_id, description, file_path))
-                conn.commit()
-                return cursor.lastrowid
+            return self._insert('''
+                INSERT INTO photos (user_id, file_id, description, file_path)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, file_id, description, file_path))
         except sqlite3.Error as e:
             logging.error(f"Error adding photo: {e}")
             return None
@@ -155,36 +407,156 @@ class Database:
     def get_user_photos(self, user_id):
         """Get user's saved photos"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self.pool.connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute('SELECT * FROM photos WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
+                cursor.execute('SELECT * FROM photos WHERE user_id = ? ORDER BY created_at DESC, id DESC', (user_id,))
                 return cursor.fetchall()
         except sqlite3.Error as e:
             logging.error(f"Error getting user photos: {e}")
             return []
-    
+
+    def get_user_photos_page(self, user_id, limit=10, after=None):
+        """One page of user's photos, newest first; after = (created_at, id) of the previous page's last row"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                if after is None:
+                    cursor.execute(
+                        'SELECT * FROM photos WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?',
+                        (user_id, limit)
+                    )
+                else:
+                    # Keyset pagination: seeks in idx_photos_user_created instead of skipping OFFSET rows
+                    cursor.execute('''
+                        SELECT * FROM photos
+                        WHERE user_id = ? AND (created_at, id) < (?, ?)
+                        ORDER BY created_at DESC, id DESC LIMIT ?
+                    ''', (user_id, after[0], after[1], limit))
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error getting user photos page: {e}")
+            return []
+
+    def delete_photo(self, photo_id, user_id):
+        """Delete user's photo; returns its file_path ('' if none) or None if not found"""
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                row = cursor.execute(
+                    'SELECT file_path FROM photos WHERE id = ? AND user_id = ?', (photo_id, user_id)
+                ).fetchone()
+                if not row:
+                    return None
+                cursor.execute('DELETE FROM photos WHERE id = ? AND user_id = ?', (photo_id, user_id))
+            return row[0] or ''
+        except sqlite3.Error as e:
+            logging.error(f"Error deleting photo: {e}")
+            return None
+
     def add_music(self, user_id, title, artist=None, file_path=None, file_id=None):
         """Add music track"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO music (user_id, title, artist, file_path, file_id)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (user_id, title, artist, file_path, file_id))
-                conn.commit()
-                return cursor.lastrowid
+            return self._insert('''
+                INSERT INTO music (user_id, title, artist, file_path, file_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, title, artist, file_path, file_id))
         except sqlite3.Error as e:
             logging.error(f"Error adding music: {e}")
             return None
     
+    def get_music_search(self, query, depth, max_age=None):
+        """Cached results for a normalized query, or None if missing/expired
+
+        A deeper cached search also answers a shallower one (ytsearch5 -> ytsearch1).
+        """
+        max_age = max_age if max_age is not None else Config.MUSIC_SEARCH_CACHE_TTL
+        try:
+            now = time.time()
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    '''
+                    SELECT id, results FROM music_search_cache
+                    WHERE query = ? AND depth >= ? AND created_at >= ?
+                    ORDER BY depth LIMIT 1
+                    ''',
+                    (query, depth, now - max_age)
+                ).fetchone()
+                if not row:
+                    return None
+                conn.execute('UPDATE music_search_cache SET last_used = ? WHERE id = ?', (now, row[0]))
+            return json.loads(row[1])[:depth]
+        except (sqlite3.Error, ValueError) as e:
+            logging.error(f"Error reading music search cache: {e}")
+            return None
+
+    def put_music_search(self, query, depth, results, max_entries=None, max_age=None):
+        """Store search results; drops expired rows and least recently used ones over max_entries"""
+        max_entries = max_entries or Config.MUSIC_SEARCH_CACHE_ENTRIES
+        max_age = max_age if max_age is not None else Config.MUSIC_SEARCH_CACHE_TTL
+        try:
+            now = time.time()
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    INSERT INTO music_search_cache (query, depth, results, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (query, depth) DO UPDATE SET
+                        results = excluded.results, created_at = excluded.created_at, last_used = excluded.last_used
+                ''', (query, depth, json.dumps(results, ensure_ascii=False), now, now))
+                conn.execute('DELETE FROM music_search_cache WHERE created_at < ?', (now - max_age,))
+                excess = conn.execute('SELECT COUNT(*) FROM music_search_cache').fetchone()[0] - max_entries
+                if excess > 0:
+                    conn.execute('''
+                        DELETE FROM music_search_cache WHERE id IN (
+                            SELECT id FROM music_search_cache ORDER BY last_used LIMIT ?
+                        )
+                    ''', (excess,))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error writing music search cache: {e}")
+            return False
+    
+    def get_delivered_media(self, source_id, kind):
+        """(file_id, title, performer) of media already sent to Telegram, or None"""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(
+                    'SELECT file_id, title, performer FROM delivered_media WHERE source_id = ? AND kind = ?',
+                    (source_id, kind)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading delivered media: {e}")
+            return None
+
+    def add_delivered_media(self, source_id, kind, file_id, title=None, performer=None):
+        """Remember the Telegram file_id of media downloaded from source_id"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute('''
+                    INSERT INTO delivered_media (source_id, kind, file_id, title, performer)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (source_id, kind) DO UPDATE SET
+                        file_id = excluded.file_id, title = excluded.title, performer = excluded.performer
+                ''', (source_id, kind, file_id, title, performer))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error saving delivered media: {e}")
+            return False
+
+    def delete_delivered_media(self, source_id, kind):
+        """Forget a file_id that Telegram no longer accepts"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute('DELETE FROM delivered_media WHERE source_id = ? AND kind = ?', (source_id, kind))
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Error deleting delivered media: {e}")
+            return False
+    
     def get_random_tiktok(self):
         """Get random TikTok video"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT * FROM tiktok_videos ORDER BY RANDOM() LIMIT 1')
-                return cursor.fetchone()
+            with self.pool.connection() as conn:
+                return self._random_row(conn, 'tiktok_videos')
         except sqlite3.Error as e:
             logging.error(f"Error getting random TikTok: {e}")
             return None
\ No newline at end of file
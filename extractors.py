@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from config import Config
+from audio_policy import audio_options
+
+TIKTOK_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36'
+
+_YOUTUBE = {
+    'geo_bypass': True,
+    'geo_bypass_country': 'KZ',
+    'cookiefile': Config.COOKIES_FILE,
+}
+
+# Named yt-dlp option sets; downloads write '%(id)s.%(ext)s' under the
+# 'paths' directory passed to acquire()
+PROFILES = {
+    'music-search': {
+        **_YOUTUBE,
+        'format': 'bestaudio/best',
+        'default_search': 'ytsearch',
+        'retries': 10,
+    },
+    'music-audio': {
+        **_YOUTUBE,
+        'outtmpl': '%(id)s.%(ext)s',
+        **audio_options(Config.MUSIC_AUDIO_MODE),
+    },
+    'tiktok-video': {
+        'format': 'bestvideo[height<=720]+bestaudio/best',
+        'outtmpl': '%(id)s.%(ext)s',
+        'user_agent': TIKTOK_USER_AGENT,
+        'merge_output_format': 'mp4',
+    },
+    'tiktok-audio': {
+        'outtmpl': '%(id)s.%(ext)s',
+        'user_agent': TIKTOK_USER_AGENT,
+        **audio_options(Config.TIKTOK_AUDIO_MODE),
+    },
+}
+
+
+class ExtractorPool:
+    """Warm yt_dlp.YoutubeDL instances per option profile
+
+    A YoutubeDL is not safe for two threads at once, so acquire() lends an
+    instance to one caller and takes it back afterwards; up to
+    EXTRACTOR_POOL_SIZE idle instances per profile are kept, with their
+    extractors, HTTP connections and ffmpeg lookups already set up. An
+    instance that raised is closed instead of reused. Profiles with a
+    cookiefile share one cookie jar, loaded once and saved on close().
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, profiles=None, size=None):
+        self.profiles = profiles or PROFILES
+        self.size = size or Config.EXTRACTOR_POOL_SIZE
+        self._idle = {name: queue.LifoQueue() for name in self.profiles}
+        self._cookies = {}  # cookiefile -> YoutubeDLCookieJar
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @classmethod
+    def shared(cls):
+        """Process-wide pool used by the media managers"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def close_shared(cls):
+        """Close the shared pool if anything created it"""
+        if cls._shared is not None:
+            cls._shared.close()
+
+    @contextmanager
+    def acquire(self, profile, **params):
+        """Lend a YoutubeDL for profile; params (e.g. paths) apply for this use only"""
+        ydl = self._take(profile)
+        saved = {key: ydl.params.get(key) for key in params}
+        ydl.params.update(params)
+        try:
+            yield ydl
+        except BaseException:
+            self._discard(ydl)
+            raise
+        for key, value in saved.items():
+            if value is None:
+                ydl.params.pop(key, None)
+            else:
+                ydl.params[key] = value
+        self._give_back(profile, ydl)
+
+    def stats(self):
+        idle = {name: pending.qsize() for name, pending in self._idle.items()}
+        return {'created': self.created, 'reused': self.reused, 'idle': idle}
+
+    def close(self):
+        """Close idle instances and write shared cookies back to their files"""
+        for pending in self._idle.values():
+            while True:
+                try:
+                    self._discard(pending.get_nowait())
+                except queue.Empty:
+                    break
+        with self._lock:
+            jars = list(self._cookies.values())
+        for jar in jars:
+            try:
+                jar.save()
+            except Exception as e:
+                logging.error(f"Error saving cookies to {jar.filename}: {e}")
+
+    def _take(self, profile):
+        try:
+            ydl = self._idle[profile].get_nowait()
+            self.reused += 1
+            return ydl
+        except queue.Empty:
+            return self._create(profile)
+
+    def _give_back(self, profile, ydl):
+        if self._idle[profile].qsize() < self.size:
+            self._idle[profile].put(ydl)
+        else:
+            self._discard(ydl)
+
+    def _create(self, profile):
+        # yt_dlp loads hundreds of extractors; import it on the first use
+        import yt_dlp
+
+        params = {'quiet': True, 'no_warnings': True, **self.profiles[profile]}
+        cookiefile = params.pop('cookiefile', None)
+        ydl = yt_dlp.YoutubeDL(params)
+        if cookiefile:
+            # Set before the first request: the HTTP handlers pick the jar up from here
+            ydl.__dict__['cookiejar'] = self._cookie_jar(cookiefile)
+        self.created += 1
+        return ydl
+
+    def _cookie_jar(self, cookiefile):
+        with self._lock:
+            jar = self._cookies.get(cookiefile)
+            if jar is None:
+                from yt_dlp.cookies import load_cookies
+                jar = self._cookies[cookiefile] = load_cookies(cookiefile, None, None)
+            return jar
+
+    @staticmethod
+    def _discard(ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            logging.error(f"Error closing YoutubeDL: {e}")
@@ -0,0 +1,225 @@
+import logging
+
+from telebot import types
+
+from config import Config
+from texts import WELCOME_TEXT
+from database import Database
+from maintenance import MaintenanceJob, format_report
+from router import MessageRouter
+from lazy import LazyObject, lazy_manager
+
+
+class BotHandlers:
+    """Update handlers shared by bot.py and async_bot.py
+
+    Both entry points build one of these around a synchronous TeleBot and
+    only decide how the handlers are called: bot.py calls them on the
+    TeleBot worker threads, async_bot.py on its light thread pool. Text
+    messages go through the router's command table, callback queries
+    through a prefix table, so a command added here exists in both bots.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        # Managers (and yt-dlp behind music/tiktok) are imported and built on first use
+        self.quote_manager = lazy_manager('quotes', 'QuoteManager', bot)
+        self.music_manager = lazy_manager('music', 'MusicManager', bot)
+        self.photo_manager = lazy_manager('photos', 'PhotoManager', bot)
+        self.tiktok_manager = lazy_manager('tiktok', 'TikTokManager', bot)
+        self.media_jobs = LazyObject(self._media_jobs, 'MediaJobScheduler')
+        self.maintenance_job = LazyObject(lambda: MaintenanceJob(Database.shared()), 'MaintenanceJob')
+
+        # Text messages are classified once and dispatched from the router's table
+        self.router = MessageRouter()
+        for names, handler in (
+            (('start', 'help'), self.send_welcome),
+            (('quote', 'q'), self.handle_quote),
+            (('quote2', 'q2'), self.handle_quote2),
+            (('my_quote', 'm_q'), self.handle_my_quote),
+            (('her_quote', 'h_q'), self.handle_her_quote),
+            (('chat_quote', 'c_q'), self.handle_chat_quote),
+            (('mchat_quote', 'mc_q'), self.handle_mchat_quote),
+            (('all_quote',), self.handle_all_quote),
+            (('delete_quote', 'd_q'), self.handle_delete_quote_cmd),
+            (('myz',), self.handle_music_search),
+            (('save_photo', 'save_scan'), self.handle_save_photo),
+            (('photos', 'scans'), self.handle_show_photos),
+            (('tiktok',), self.handle_random_tiktok),
+            (('recount',), self.handle_recount),
+            (('maintenance',), self.handle_maintenance),
+        ):
+            self.router.command(*names)(handler)
+        self.router.on('music_text')(self.handle_myz_text)
+        self.router.on('tiktok_url')(self.handle_tiktok_url)
+
+        # Callback data prefix -> handler, checked in order
+        self.callbacks = (
+            ('music_choose_', lambda call: self.music_manager.handle_music_selection(call)),
+            ('delete_quote_', lambda call: self.quote_manager.handle_delete_quote(call)),
+            ('delete_photo_', lambda call: self.photo_manager.handle_delete_photo(call)),
+            ('photos_page_', lambda call: self.photo_manager.handle_photos_page(call)),
+            ('download_', lambda call: self.tiktok_manager.handle_download_callback(call)),
+            ('cancel_job_', lambda call: self.media_jobs.handle_cancel_callback(call)),
+        )
+
+    def _media_jobs(self):
+        from media_jobs import MediaJobScheduler
+        return MediaJobScheduler.shared(self.bot)
+
+    def send_welcome(self, message):
+        # Кнопка "Добавить в группу" (bot.user calls get_me once and caches it)
+        add_group_btn = types.InlineKeyboardMarkup()
+        add_group_btn.add(
+            types.InlineKeyboardButton("➕ Добавить бота в группу", url=f"https://t.me/{self.bot.user.username}?startgroup=true")
+        )
+
+        self.bot.reply_to(message, WELCOME_TEXT, reply_markup=add_group_btn)
+
+    # Quote commands
+    def handle_quote(self, message):
+        self.quote_manager.handle_quote_command(message, quote_type=1)
+
+    def handle_quote2(self, message):
+        self.quote_manager.handle_quote_command(message, quote_type=2)
+
+    def handle_my_quote(self, message):
+        try:
+            parts = message.text.split()
+            quote_number = int(parts[1]) if len(parts) > 1 else None
+            self.quote_manager.handle_my_quote(message, quote_number)
+        except (ValueError, IndexError):
+            self.quote_manager.handle_my_quote(message)
+
+    def handle_her_quote(self, message):
+        # This would be similar to my_quote but for the replied user
+        if not message.reply_to_message:
+            self.bot.reply_to(message, "❌ Ответьте на сообщение пользователя!")
+            return
+        # Implementation would be similar to my_quote
+        self.bot.reply_to(message, "🚧 Функция в разработке!")
+
+    def handle_chat_quote(self, message):
+        try:
+            parts = message.text.split()
+            quote_number = int(parts[1]) if len(parts) > 1 else None
+            self.quote_manager.handle_chat_quote(message, quote_number)
+        except (ValueError, IndexError):
+            self.quote_manager.handle_chat_quote(message)
+
+    def handle_mchat_quote(self, message):
+        # User's quotes from current chat
+        self.bot.reply_to(message, "🚧 Функция в разработке!")
+
+    def handle_all_quote(self, message):
+        self.quote_manager.handle_all_quote(message)
+
+    def handle_delete_quote_cmd(self, message):
+        try:
+            parts = message.text.split()
+            if len(parts) > 1:
+                quote_id = int(parts[1])
+                # This would call quote_manager.handle_delete_quote with proper parameters
+                self.bot.reply_to(message, "🚧 Используйте кнопку удаления под цитатой!")
+            else:
+                self.bot.reply_to(message, "❌ Укажите ID цитаты!")
+        except ValueError:
+            self.bot.reply_to(message, "❌ Неверный ID цитаты!")
+
+    # Music commands
+    def handle_music_search(self, message):
+        query = message.text[len('/myz'):].strip()
+        if not query:
+            self.bot.reply_to(message, "❗ Введите название трека. Пример: `/myz либо Муз Shape of You`", parse_mode="Markdown")
+            return
+        self.music_manager.search_music_list(message, query)
+
+    def handle_myz_text(self, message):
+        query = message.text[4:].strip()  # "Муз " сөзінен кейін бәрі
+        if not query:
+            self.bot.reply_to(message, "🎵 Қандай ән керек екенін жазыңыз. Мысалы: `Муз Ерке Есмахан`", parse_mode='Markdown')
+            return
+        self.music_manager.show_music_options(message, query)
+
+    # Photo commands
+    def handle_save_photo(self, message):
+        self.photo_manager.save_photo(message)
+
+    def handle_show_photos(self, message):
+        self.photo_manager.show_user_photos(message)
+
+    # TikTok commands
+    def handle_random_tiktok(self, message):
+        self.tiktok_manager.get_random_tiktok(message)
+
+    def handle_tiktok_url(self, message):
+        self.tiktok_manager.download_tiktok_video(message, self.router.classify(message).url)
+
+    # Admin commands
+    def handle_recount(self, message):
+        if message.from_user.id not in Config.ADMIN_IDS:
+            self.bot.reply_to(message, "❌ Команда доступна только администраторам!")
+            return
+        users = self.quote_manager.db.recompute_usage()
+        if users is None:
+            self.bot.reply_to(message, "❌ Ошибка при пересчете счетчиков!")
+        else:
+            self.bot.reply_to(message, f"✅ Счетчики пересчитаны для {users} пользователей")
+
+    def handle_maintenance(self, message):
+        if message.from_user.id not in Config.ADMIN_IDS:
+            self.bot.reply_to(message, "❌ Команда доступна только администраторам!")
+            return
+        self.bot.reply_to(message, format_report(self.maintenance_job.run_once()))
+
+    # Callback queries
+    def handle_callback_query(self, call):
+        try:
+            for prefix, handler in self.callbacks:
+                if call.data.startswith(prefix):
+                    handler(call)
+                    return
+            self.bot.answer_callback_query(call.id, "❌ Неизвестная команда!")
+
+        except Exception as e:
+            logging.error(f"Error handling callback: {e}")
+            self.bot.answer_callback_query(call.id, "❌ Произошла ошибка!")
+
+    # Inline queries (for accessing quotes and photos from any chat)
+    @staticmethod
+    def is_quotes_query(query):
+        return query.query.lower().startswith('цитаты') or query.query.lower() == ''
+
+    @staticmethod
+    def is_photos_query(query):
+        return query.query.lower().startswith('photos')
+
+    def handle_inline_quotes(self, query):
+        try:
+            results, next_offset = self.quote_manager.inline_results(query)
+            self.bot.answer_inline_query(query.id, results, cache_time=60, is_personal=True, next_offset=next_offset)
+
+        except Exception as e:
+            logging.error(f"Error handling inline query: {e}")
+
+    def handle_inline_photos(self, query):
+        try:
+            results = self.photo_manager.inline_results(query)
+            self.bot.answer_inline_query(query.id, results, cache_time=60)
+
+        except Exception as e:
+            logging.error(f"Error handling inline photos: {e}")
+
+    def shutdown(self, wait=True):
+        """Stop whatever the handlers started (call before closing the database)"""
+        if self.maintenance_job.loaded:
+            self.maintenance_job.stop()
+        if self.media_jobs.loaded:
+            self.media_jobs.shutdown(wait=wait)
+        if self.music_manager.loaded:
+            self.music_manager.prefetcher.shutdown()
+        if self.music_manager.loaded or self.tiktok_manager.loaded:
+            # Only the media managers create the pool; importing it here keeps it out of startup
+            from extractors import ExtractorPool
+            ExtractorPool.close_shared()
@@ -0,0 +1,103 @@
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.util.retry import Retry
+
+from config import Config
+
+# Safe to repeat after a timeout or a 5xx: they don't send or change messages
+IDEMPOTENT_METHODS = {'setWebhook', 'deleteWebhook', 'sendChatAction'}
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+def is_idempotent(api_method):
+    return api_method.startswith('get') or api_method in IDEMPOTENT_METHODS
+
+
+class TimeoutSession(requests.Session):
+    """Session with a default timeout for callers that pass none (apihelper.download_file)"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+class TelegramSessions:
+    """Shared keep-alive HTTP sessions for Bot API traffic
+
+    By default telebot gives every thread its own requests.Session, so each
+    handler and media worker does its own TCP/TLS handshakes, and uploads
+    share timeouts with answerCallbackQuery. Here two sessions are shared by
+    all threads:
+
+    control — small JSON calls, pool sized to every thread that calls the API
+    media   — requests with files, plus download_file; long read timeout
+    """
+
+    def __init__(self, control_pool=None, media_pool=None):
+        handlers = max(Config.BOT_WORKERS, Config.LIGHT_WORKERS)
+        # +1: the getUpdates long poll holds a connection of its own
+        self.control = self._session(control_pool or handlers + Config.MEDIA_WORKERS + 1)
+        # download_file passes no timeout: it gets the upload one from the session
+        self.media = self._session(media_pool or Config.MEDIA_WORKERS + 2,
+                                   (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_UPLOAD_TIMEOUT))
+        self.retried = 0
+
+    @staticmethod
+    def _session(pool_size, timeout=None):
+        session = TimeoutSession(timeout) if timeout else requests.Session()
+        # Connection failures never reached Telegram, so they are retried for any method
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=None, connect=3, read=0, status=0, redirect=0, backoff_factor=0.2),
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def install(self):
+        """Send every apihelper request (and download_file) through these sessions"""
+        apihelper.CUSTOM_REQUEST_SENDER = self.send
+        apihelper.session = self.media
+        return self
+
+    def send(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        api_method = url.rsplit('/', 1)[-1]
+        read_timeout = timeout[1] if timeout else apihelper.READ_TIMEOUT
+        if files:
+            session = self.media
+            read_timeout = max(read_timeout, Config.HTTP_UPLOAD_TIMEOUT)
+        else:
+            # read_timeout already covers long polling for getUpdates
+            session = self.control
+        timeout = (Config.HTTP_CONNECT_TIMEOUT, read_timeout)
+
+        retries = Config.HTTP_RETRIES if is_idempotent(api_method) else 0
+        for attempt in range(retries + 1):
+            try:
+                response = session.request(method, url, params=params, files=files,
+                                           timeout=timeout, proxies=proxies)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    raise
+                logging.debug(f"Retrying {api_method} after {type(e).__name__}")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                logging.debug(f"Retrying {api_method} after HTTP {response.status_code}")
+            self.retried += 1
+            time.sleep(0.5 * 2 ** attempt)
+
+    def close(self):
+        self.control.close()
+        self.media.close()
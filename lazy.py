@@ -0,0 +1,43 @@
+import importlib
+import threading
+
+
+class LazyObject:
+    """Proxy that builds the real object on first attribute access
+
+    Handlers keep calling manager.method(...) as before; the module behind
+    the manager is imported and the manager constructed only when the first
+    update that needs it arrives.
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'object')
+        self._obj = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._obj is not None
+
+    def load(self):
+        """Build the object once (thread-safe) and return it"""
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+        return self._obj
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyObject {self._name} ({state})>"
+
+
+def lazy_manager(module, class_name, *args):
+    """LazyObject for module.class_name(*args), importing module on first use"""
+    def factory():
+        return getattr(importlib.import_module(module), class_name)(*args)
+    return LazyObject(factory, f"{module}.{class_name}")
@@ -0,0 +1,160 @@
+import os
+import glob
+import sqlite3
+import logging
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+
+
+class MaintenanceJob:
+    """Scheduled backup, retention and compaction for the bot database"""
+
+    def __init__(self, db, interval=None):
+        self.db = db
+        self.interval = interval if interval is not None else Config.MAINTENANCE_INTERVAL_HOURS * 3600
+        self._stop = threading.Event()
+        self._thread = None
+        self._run_lock = threading.Lock()
+        os.makedirs(Config.BACKUP_DIR, exist_ok=True)
+
+    def start(self):
+        """Run maintenance every interval on a background thread"""
+        if self._thread or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name='db-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        """Backup, prune, vacuum and analyze; returns a report dict"""
+        with self._run_lock:
+            started = time.monotonic()
+            report = {'size_before': self._db_size()}
+
+            try:
+                report['backup'] = self.backup()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"Database backup failed: {e}")
+                report['backup'] = None
+
+            try:
+                report['pruned'] = self.apply_retention()
+            except sqlite3.Error as e:
+                logging.error(f"Retention cleanup failed: {e}")
+                report['pruned'] = {}
+
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                logging.error(f"Database compaction failed: {e}")
+
+            report['size_after'] = self._db_size()
+            report['reclaimed'] = max(report['size_before'] - report['size_after'], 0)
+            report['seconds'] = round(time.monotonic() - started, 2)
+            logging.info(f"Database maintenance finished: {report}")
+            return report
+
+    def backup(self):
+        """Hot backup through the sqlite3 backup API; returns the backup path"""
+        name = os.path.splitext(os.path.basename(self.db.db_path))[0]
+        path = self._reserve_backup_path(name)
+
+        target = sqlite3.connect(path)
+        try:
+            with self.db.pool.connection() as conn:
+                # Copy in small steps so writers only wait for one step at a time
+                conn.backup(target, pages=Config.BACKUP_PAGES_PER_STEP, sleep=0.005)
+        except BaseException:
+            target.close()
+            os.remove(path)
+            raise
+        target.close()
+
+        backups = sorted(glob.glob(os.path.join(Config.BACKUP_DIR, f"{name}-*.db")))
+        for old in backups[:-Config.BACKUP_KEEP]:
+            os.remove(old)
+        return path
+
+    @staticmethod
+    def _reserve_backup_path(name):
+        """Create an empty, not yet used backup file and return its path
+
+        The timestamp has microseconds and the file is created exclusively,
+        so two runs (or two bot processes) never write to the same backup.
+        """
+        while True:
+            timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            path = os.path.join(Config.BACKUP_DIR, f"{name}-{timestamp}.db")
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return path
+            except FileExistsError:
+                continue
+
+    def apply_retention(self):
+        """Delete rows past their retention age or whose files are gone"""
+        pruned = {}
+        with self.db.pool.connection() as conn:
+            for table, days in Config.RETENTION_DAYS.items():
+                if days:
+                    cursor = conn.execute(
+                        f"DELETE FROM {table} WHERE created_at < datetime('now', ?)",
+                        (f'-{int(days)} days',)
+                    )
+                    pruned[table] = cursor.rowcount
+
+            # Media rows whose file was already removed after sending
+            for table in ('music', 'tiktok_videos'):
+                rows = conn.execute(
+                    f'SELECT id, file_path FROM {table} WHERE file_path IS NOT NULL'
+                ).fetchall()
+                missing = [(row_id,) for row_id, file_path in rows if not os.path.exists(file_path)]
+                if missing:
+                    conn.executemany(f'DELETE FROM {table} WHERE id = ?', missing)
+                pruned[table] = pruned.get(table, 0) + len(missing)
+        return pruned
+
+    def compact(self):
+        """Return free pages to the OS and refresh planner statistics"""
+        with self.db.pool.connection() as conn:
+            auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            if auto_vacuum != 2:
+                # One-time switch to incremental mode needs a full VACUUM
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                # Each step of the pragma frees one page: executescript runs it to the end
+                conn.executescript('PRAGMA incremental_vacuum;')
+            conn.execute('ANALYZE')
+            conn.execute('PRAGMA optimize')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def _db_size(self):
+        with self.db.pool.connection() as conn:
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return page_count * page_size
+
+
+def format_report(report):
+    """Human-readable maintenance summary for the admin command"""
+    pruned = ', '.join(f"{table}: {count}" for table, count in report['pruned'].items()) or '—'
+    return (
+        f"🧹 Обслуживание БД завершено за {report['seconds']}с\n"
+        f"💾 Бэкап: {report['backup'] or 'ошибка'}\n"
+        f"🗑 Удалено строк: {pruned}\n"
+        f"📦 Размер: {report['size_before'] // 1024} KB → {report['size_after'] // 1024} KB "
+        f"(освобождено {report['reclaimed'] // 1024} KB)"
+    )
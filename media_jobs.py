@@ -0,0 +1,270 @@
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import Config
+
+
+class QueueFull(Exception):
+    """Raised when the media queue (global or per user) has no room"""
+
+
+class MediaJob:
+    """One yt-dlp/ffmpeg task waiting for or running on a media worker"""
+
+    def __init__(self, job_id, user_id, chat_id, func, args, kwargs, status=None):
+        self.id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = status  # message to edit with the queue position
+        self.state = 'queued'  # queued -> running -> done / cancelled
+        self.position = None
+        self.notified = False  # a queue position was shown to the user
+        self.cancelled = threading.Event()
+
+
+class MediaJobScheduler:
+    """Fixed pool of media workers with a bounded, fair, cancellable queue
+
+    Jobs are taken round-robin across chats and, inside a chat, across users,
+    so one busy group or one user with many links can't hog the workers.
+    Each user has at most MEDIA_PER_USER_RUNNING jobs running at once.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, bot, workers=None, max_queued=None, per_user_running=None, per_user_queued=None):
+        self.bot = bot
+        self.workers = workers or Config.MEDIA_WORKERS
+        self.max_queued = max_queued or Config.MEDIA_QUEUE_SIZE
+        self.per_user_running = per_user_running or Config.MEDIA_PER_USER_RUNNING
+        self.per_user_queued = per_user_queued or Config.MEDIA_PER_USER_QUEUED
+
+        self._chats = OrderedDict()  # chat_id -> OrderedDict(user_id -> deque of jobs)
+        self._jobs = {}  # job_id -> job (queued or running)
+        self._running = {}  # user_id -> running job count
+        self._queued = 0
+        self._idle_workers = 0
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'media-{i}', daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def shared(cls, bot):
+        """Process-wide scheduler shared by the media managers"""
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls(bot)
+        return cls._shared
+
+    def submit(self, user_id, chat_id, func, *args, status=None, **kwargs):
+        """Queue func(*args, **kwargs); raises QueueFull when there is no room
+
+        While the job waits, status shows its queue position. The text func
+        returns (e.g. "✅ ..." or "❌ ...") replaces whatever is on status when
+        it finishes, and a job that raises leaves an error there. func returns
+        None only when it has put its own content (a menu) on the status.
+        """
+        with self._cond:
+            if self._stopping:
+                raise QueueFull("Scheduler is stopping")
+            if self._queued >= self.max_queued:
+                raise QueueFull("Media queue is full")
+            users = self._chats.setdefault(chat_id, OrderedDict())
+            pending = users.setdefault(user_id, deque())
+            if len(pending) >= self.per_user_queued:
+                raise QueueFull("Too many queued jobs for this user")
+
+            job = MediaJob(next(self._ids), user_id, chat_id, func, args, kwargs, status)
+            pending.append(job)
+            self._jobs[job.id] = job
+            self._queued += 1
+            # Don't flash "#1 in queue" for a job an idle worker picks up right away
+            starts_now = self._idle_workers > 0 and self._running.get(user_id, 0) < self.per_user_running
+            updates = [(queued, position) for queued, position in self._position_updates()
+                       if not (starts_now and queued is job)]
+            self._cond.notify()
+
+        self._publish_positions(updates)
+        return job
+
+    def cancel(self, job_id, user_id):
+        """Cancel a queued job owned by user_id; returns the job or None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if not job or job.user_id != user_id or job.state != 'queued':
+                return None
+            self._chats[job.chat_id][job.user_id].remove(job)
+            self._cleanup_queue(job.chat_id, job.user_id)
+            self._queued -= 1
+            del self._jobs[job_id]
+            job.state = 'cancelled'
+            job.cancelled.set()
+            updates = self._position_updates()
+
+        self._edit_status(job, "❌ Отменено")
+        self._publish_positions(updates)
+        return job
+
+    def handle_cancel_callback(self, call):
+        """Callback for the "cancel" button under a queued status message"""
+        try:
+            job_id = int(call.data.split('_')[2])
+            job = self._jobs.get(job_id)
+            if job and job.user_id != call.from_user.id:
+                self.bot.answer_callback_query(call.id, "❗ Это не ваш запрос.")
+            elif self.cancel(job_id, call.from_user.id):
+                self.bot.answer_callback_query(call.id, "Отменено")
+            elif job and job.state == 'running':
+                self.bot.answer_callback_query(call.id, "⏳ Уже обрабатывается")
+            else:
+                self.bot.answer_callback_query(call.id, "❌ Задача не найдена")
+        except Exception as e:
+            logging.error(f"Error cancelling media job: {e}")
+            self.bot.answer_callback_query(call.id, "❌ Ошибка при отмене!")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': self._queued,
+                'running': sum(self._running.values()),
+                'workers': self.workers,
+            }
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs, drop queued ones and let running ones finish"""
+        dropped = []
+        with self._cond:
+            self._stopping = True
+            for users in self._chats.values():
+                for pending in users.values():
+                    for job in pending:
+                        job.state = 'cancelled'
+                        job.cancelled.set()
+                        self._jobs.pop(job.id, None)
+                        dropped.append(job)
+            self._chats.clear()
+            self._queued = 0
+            self._cond.notify_all()
+        for job in dropped:
+            self._edit_status(job, "❌ Отменено")
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._stopping:
+                    self._idle_workers += 1
+                    self._cond.wait()
+                    self._idle_workers -= 1
+                    job = self._next_job()
+                if job is None:
+                    return
+                job.state = 'running'
+                self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+                updates = self._position_updates()
+
+            if job.notified:
+                self._edit_status(job, "⚙️ Обрабатываю...")
+            self._publish_positions(updates)
+
+            final = None
+            try:
+                final = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                logging.error(f"Media job {job.id} failed: {e}", exc_info=True)
+                final = "❌ Произошла ошибка!"
+            finally:
+                with self._cond:
+                    job.state = 'done'
+                    self._jobs.pop(job.id, None)
+                    self._running[job.user_id] -= 1
+                    if not self._running[job.user_id]:
+                        del self._running[job.user_id]
+                    # A slot for this user opened up; wake a worker to re-check
+                    self._cond.notify()
+                # Never leave "⚙️ Обрабатываю..." (or the cancel button) behind
+                if final:
+                    self._edit_status(job, final)
+
+    def _next_job(self):
+        """Round-robin over chats, then users; skip users at their running limit"""
+        for chat_id in list(self._chats):
+            users = self._chats[chat_id]
+            for user_id in list(users):
+                if self._running.get(user_id, 0) >= self.per_user_running:
+                    continue
+                job = users[user_id].popleft()
+                self._queued -= 1
+                users.move_to_end(user_id)
+                self._chats.move_to_end(chat_id)
+                self._cleanup_queue(chat_id, user_id)
+                return job
+        return None
+
+    def _cleanup_queue(self, chat_id, user_id):
+        users = self._chats.get(chat_id)
+        if users is not None and not users.get(user_id):
+            users.pop(user_id, None)
+            if not users:
+                del self._chats[chat_id]
+
+    def _position_updates(self):
+        """Simulate the round-robin order; return jobs whose position changed"""
+        order = []
+        chats = [[deque(pending) for pending in users.values()] for users in self._chats.values()]
+        while chats:
+            for users in list(chats):
+                pending = users.pop(0)
+                order.append(pending.popleft())
+                if pending:
+                    users.append(pending)
+                if not users:
+                    chats.remove(users)
+
+        updates = []
+        for position, job in enumerate(order, 1):
+            if job.position != position:
+                job.position = position
+                if job.status is not None:
+                    updates.append((job, position))
+        return updates
+
+    def _publish_positions(self, updates):
+        for job, position in updates:
+            if job.state != 'queued':
+                continue
+            job.notified = True
+            keyboard = InlineKeyboardMarkup()
+            keyboard.add(InlineKeyboardButton("✖️ Отменить", callback_data=f"cancel_job_{job.id}"))
+            self._edit_status(job, f"⏳ Вы #{position} в очереди...", keyboard)
+
+    def _edit_status(self, job, text, keyboard=None):
+        if job.status is None:
+            return
+        try:
+            self.bot.edit_message_text(
+                text,
+                job.status.chat.id,
+                job.status.message_id,
+                reply_markup=keyboard
+            )
+        except Exception as e:
+            logging.debug(f"Could not update status of media job {job.id}: {e}")
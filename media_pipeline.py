@@ -0,0 +1,223 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import requests
+
+from config import Config
+from audio_policy import downloaded_path
+from extractors import ExtractorPool
+
+# Containers sent to Telegram as they come, per kind of upload
+SEND_AS_IS = {'audio': ('m4a', 'mp3'), 'video': ('mp4',)}
+
+# MP4-family files need seeking (the index may sit at the end): not for pipe:0
+UNPIPEABLE = ('mp4', 'm4a', 'mov', '3gp')
+
+MP3_ENCODE = ['-vn', '-c:a', 'libmp3lame', '-b:a', '192k', '-f', 'mp3']
+
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class MediaFile:
+    """Downloaded media ready for upload: a file object, its name and the yt-dlp info"""
+
+    def __init__(self, file, filename, info):
+        self.file = file
+        self.filename = filename
+        self.info = info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.file.close()
+
+    @property
+    def upload(self):
+        """(filename, file) for send_audio/send_video, rewound to the start"""
+        self.file.seek(0)
+        return self.filename, self.file
+
+
+class MediaPipeline:
+    """Downloads media for upload without keeping files around
+
+    When yt-dlp resolves a URL to one progressive HTTP stream, it is fetched
+    in Range chunks into a SpooledTemporaryFile: in memory up to
+    MEDIA_SPOOL_BYTES, an anonymous temp file above that. Audio that needs
+    an MP3 transcode is piped through ffmpeg on the way. Anything else
+    (DASH video+audio merges, HLS, remuxes) is downloaded by yt-dlp into a
+    private TemporaryDirectory with id-based names. Either way the buffer or
+    directory is gone when the `with` block ends, even on errors.
+    """
+
+    def __init__(self, extractors=None, spool_bytes=None, chunk_bytes=None):
+        self.extractors = extractors or ExtractorPool.shared()
+        self.spool_bytes = spool_bytes or Config.MEDIA_SPOOL_BYTES
+        self.chunk_bytes = chunk_bytes or Config.MEDIA_CHUNK_BYTES
+        self.session = requests.Session()
+        self.streamed = 0
+        self.downloaded = 0
+
+    def resolve(self, url, profile):
+        """(info, request headers) of the format yt-dlp picks for url with profile"""
+        with self.extractors.acquire(profile) as ydl:
+            info = ydl.extract_info(url, download=False)
+            return info, self._headers(ydl, info)
+
+    def reuse(self, info, profile):
+        """resolve() result for profile from info extracted earlier, without extracting again
+
+        The formats are picked again with profile's options (e.g. audio only).
+        """
+        with self.extractors.acquire(profile) as ydl:
+            info = ydl.process_ie_result(ydl.sanitize_info(info, True), download=False)
+            return info, self._headers(ydl, info)
+
+    @contextmanager
+    def open(self, url, profile, kind, mp3=False, resolved=None):
+        """Yield a MediaFile for url; kind is 'audio' or 'video', mp3 forces an MP3 transcode
+
+        resolved is an earlier resolve() result for the same url and profile.
+        """
+        info, headers = resolved or self.resolve(url, profile)
+
+        media = None
+        try:
+            media = self.spool(info, headers, kind, mp3)
+        except (requests.RequestException, OSError, subprocess.SubprocessError) as e:
+            logging.warning(f"Streaming {url} failed, downloading with yt-dlp: {e}")
+
+        if media is not None:
+            with media:
+                yield media
+            return
+
+        with tempfile.TemporaryDirectory(prefix='media-') as directory:
+            with self.extractors.acquire(profile, paths={'home': directory}) as ydl:
+                # Reuses the resolved info: no second extraction
+                info = ydl.process_ie_result(info, download=True)
+            path = downloaded_path(info)
+            if not path or not os.path.exists(path):
+                raise FileNotFoundError(f"yt-dlp produced no file for {url}")
+            self.downloaded += 1
+            with open(path, 'rb') as file:
+                yield MediaFile(file, self._filename(info, os.path.splitext(path)[1][1:]), info)
+
+    def stats(self):
+        return {'streamed': self.streamed, 'downloaded': self.downloaded}
+
+    def spool(self, info, headers, kind, mp3=False, cancelled=None, max_bytes=None, spool_bytes=None):
+        """MediaFile of a single progressive HTTP format, or None when yt-dlp has to do it
+
+        Setting the cancelled Event, or a source over max_bytes, aborts the
+        transfer with InterruptedError; the caller closes the returned file.
+        spool_bytes overrides how much of it is kept in memory.
+        """
+        if (not info or info.get('requested_formats') or not info.get('url')
+                or info.get('protocol') not in ('http', 'https')):
+            return None
+        ext = info.get('ext')
+        transcode = ext not in SEND_AS_IS[kind] or (mp3 and ext != 'mp3')
+        if transcode and (kind != 'audio' or ext in UNPIPEABLE):
+            return None
+
+        buffer = tempfile.SpooledTemporaryFile(max_size=spool_bytes or self.spool_bytes)
+        try:
+            chunks = self._chunks(info['url'], headers, cancelled, max_bytes)
+            if transcode:
+                self._transcode(chunks, buffer)
+                ext = 'mp3'
+            else:
+                for chunk in chunks:
+                    buffer.write(chunk)
+            if not buffer.tell():
+                raise OSError("empty stream")
+        except BaseException:
+            buffer.close()
+            raise
+
+        self.streamed += 1
+        return MediaFile(buffer, self._filename(info, ext), info)
+
+    @staticmethod
+    def _headers(ydl, info):
+        """Request headers yt-dlp would send for the chosen format, cookies included"""
+        headers = dict((info or {}).get('http_headers') or {})
+        if info and info.get('url'):
+            cookie = ydl.cookiejar.get_cookie_header(info['url'])
+            if cookie:
+                headers['Cookie'] = cookie
+        return headers
+
+    def _chunks(self, url, headers, cancelled=None, max_bytes=None):
+        """Body of url in Range requests of chunk_bytes (servers throttle unranged reads)"""
+        start = 0
+        while True:
+            end = start + self.chunk_bytes - 1
+            with self.session.get(url, headers={**headers, 'Range': f'bytes={start}-{end}'},
+                                  stream=True, timeout=(Config.HTTP_CONNECT_TIMEOUT, 60)) as response:
+                response.raise_for_status()
+                received = 0
+                for chunk in response.iter_content(64 * 1024):
+                    received += len(chunk)
+                    if cancelled is not None and cancelled.is_set():
+                        raise InterruptedError(f"download of {url} cancelled")
+                    if max_bytes and start + received > max_bytes:
+                        raise InterruptedError(f"{url} is over {max_bytes} bytes")
+                    yield chunk
+                if response.status_code != 206:
+                    return  # the server ignored Range and sent everything
+                total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            start += received
+            if received < self.chunk_bytes or (total.isdigit() and start >= int(total)):
+                return
+
+    @staticmethod
+    def _transcode(chunks, out):
+        """Pipe chunks through ffmpeg into out as 192 kbps MP3"""
+        process = subprocess.Popen(
+            ['ffmpeg', '-v', 'error', '-i', 'pipe:0', *MP3_ENCODE, 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        errors = []
+
+        def feed():
+            try:
+                for chunk in chunks:
+                    process.stdin.write(chunk)
+            except BrokenPipeError:
+                pass
+            except Exception as e:
+                errors.append(e)
+                process.kill()
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            shutil.copyfileobj(process.stdout, out)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            feeder.join()
+        if errors:
+            raise errors[0]
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, 'ffmpeg')
+
+    @staticmethod
+    def _filename(info, ext):
+        """Upload name: Telegram shows it, and the extension decides how it is played"""
+        title = UNSAFE_FILENAME_RE.sub('_', info.get('title') or '').strip(' ._')[:60]
+        return f"{title or info.get('id') or 'media'}.{ext}"
@@ -0,0 +1,307 @@
+import sqlite3
+import logging
+
+
+# Table -> user_usage column kept in sync by triggers (migration 4)
+USAGE_TABLES = {
+    'quotes': 'quotes',
+    'photos': 'photos',
+    'music': 'music',
+    'tiktok_videos': 'tiktok',
+}
+
+# Rebuild user_usage from scratch; used by migration 4 and the admin recount
+RECOUNT_USAGE_SQL = [
+    'DELETE FROM user_usage',
+    '''
+    INSERT INTO user_usage (user_id, quotes, photos, music, tiktok)
+    SELECT user_id, SUM(quotes), SUM(photos), SUM(music), SUM(tiktok) FROM (
+        SELECT user_id, COUNT(*) AS quotes, 0 AS photos, 0 AS music, 0 AS tiktok FROM quotes GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, COUNT(*), 0, 0 FROM photos GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, 0, COUNT(*), 0 FROM music GROUP BY user_id
+        UNION ALL
+        SELECT user_id, 0, 0, 0, COUNT(*) FROM tiktok_videos GROUP BY user_id
+    )
+    GROUP BY user_id
+    ''',
+]
+
+# Ordered list of (version, description, statements).
+# Append new steps at the end; never edit a step that has already shipped.
+MIGRATIONS = [
+    (1, "Base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS quotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            message_text TEXT NOT NULL,
+            author_name TEXT,
+            author_id INTEGER,
+            quote_type INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            description TEXT,
+            file_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS music (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            artist TEXT,
+            file_path TEXT,
+            file_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS tiktok_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            file_path TEXT,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, "Indexes for per-user and per-chat quote/photo lookups", [
+        'CREATE INDEX IF NOT EXISTS idx_quotes_user_created ON quotes (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_quotes_chat_created ON quotes (chat_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_quotes_chat_user ON quotes (chat_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_photos_user_created ON photos (user_id, created_at)',
+        'ANALYZE',
+    ]),
+    (3, "Full-text search over quotes (FTS5)", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+            message_text,
+            author_name,
+            content='quotes',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_ai AFTER INSERT ON quotes BEGIN
+            INSERT INTO quotes_fts (rowid, message_text, author_name)
+            VALUES (new.id, new.message_text, new.author_name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_ad AFTER DELETE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, message_text, author_name)
+            VALUES ('delete', old.id, old.message_text, old.author_name);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_au AFTER UPDATE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, message_text, author_name)
+            VALUES ('delete', old.id, old.message_text, old.author_name);
+            INSERT INTO quotes_fts (rowid, message_text, author_name)
+            VALUES (new.id, new.message_text, new.author_name);
+        END
+        ''',
+        # Backfill the index from quotes saved before this migration
+        "INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')",
+    ]),
+    (4, "Per-user usage counters for quotas", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_usage (
+            user_id INTEGER PRIMARY KEY,
+            quotes INTEGER NOT NULL DEFAULT 0,
+            photos INTEGER NOT NULL DEFAULT 0,
+            music INTEGER NOT NULL DEFAULT 0,
+            tiktok INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        *[statement for table, column in USAGE_TABLES.items() for statement in (
+            f'''
+            CREATE TRIGGER IF NOT EXISTS usage_{column}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO user_usage (user_id, {column}) VALUES (new.user_id, 1)
+                ON CONFLICT (user_id) DO UPDATE SET {column} = {column} + 1;
+            END
+            ''',
+            f'''
+            CREATE TRIGGER IF NOT EXISTS usage_{column}_ad AFTER DELETE ON {table} BEGIN
+                UPDATE user_usage SET {column} = MAX({column} - 1, 0) WHERE user_id = old.user_id;
+            END
+            ''',
+        )],
+        *RECOUNT_USAGE_SQL,
+    ]),
+    (5, "Music search result cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS music_search_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            query TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            results TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            UNIQUE (query, depth)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_music_search_cache_last_used ON music_search_cache (last_used)',
+    ]),
+    (6, "Telegram file_id of already delivered media, by source video id", [
+        '''
+        CREATE TABLE IF NOT EXISTS delivered_media (
+            source_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            title TEXT,
+            performer TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_id, kind)
+        )
+        ''',
+    ]),
+    (7, "Per-user and per-chat quote ordinals for numbered lookups", [
+        'ALTER TABLE quotes ADD COLUMN user_seq INTEGER',
+        'ALTER TABLE quotes ADD COLUMN chat_seq INTEGER',
+        # The ordinals change on every insert; only text changes concern the FTS index
+        'DROP TRIGGER IF EXISTS quotes_fts_au',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_au AFTER UPDATE OF message_text, author_name ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, message_text, author_name)
+            VALUES ('delete', old.id, old.message_text, old.author_name);
+            INSERT INTO quotes_fts (rowid, message_text, author_name)
+            VALUES (new.id, new.message_text, new.author_name);
+        END
+        ''',
+        # Backfill, oldest = 1, through a keyed temp table (one pass, no correlated scans)
+        'CREATE TEMP TABLE quote_seq (id INTEGER PRIMARY KEY, user_seq INTEGER, chat_seq INTEGER)',
+        '''
+        INSERT INTO quote_seq
+        SELECT id,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at, id),
+               ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY created_at, id)
+        FROM quotes
+        ''',
+        '''
+        UPDATE quotes SET
+            user_seq = (SELECT user_seq FROM quote_seq WHERE quote_seq.id = quotes.id),
+            chat_seq = (SELECT chat_seq FROM quote_seq WHERE quote_seq.id = quotes.id)
+        ''',
+        'DROP TABLE quote_seq',
+        'CREATE INDEX IF NOT EXISTS idx_quotes_user_seq ON quotes (user_id, user_seq)',
+        'CREATE INDEX IF NOT EXISTS idx_quotes_chat_seq ON quotes (chat_id, chat_seq)',
+        # New quotes take the next number (MAX is one index seek); a delete
+        # closes the gap by renumbering the newer quotes of that user and chat
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_seq_ai AFTER INSERT ON quotes BEGIN
+            UPDATE quotes SET
+                user_seq = (SELECT COALESCE(MAX(user_seq), 0) + 1 FROM quotes WHERE user_id = new.user_id),
+                chat_seq = (SELECT COALESCE(MAX(chat_seq), 0) + 1 FROM quotes WHERE chat_id = new.chat_id)
+            WHERE id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_seq_ad AFTER DELETE ON quotes BEGIN
+            UPDATE quotes SET user_seq = user_seq - 1 WHERE user_id = old.user_id AND user_seq > old.user_seq;
+            UPDATE quotes SET chat_seq = chat_seq - 1 WHERE chat_id = old.chat_id AND chat_seq > old.chat_seq;
+        END
+        ''',
+    ]),
+    (8, "Owner column in the quote FTS index, so MATCH filters by user", [
+        'DROP TRIGGER IF EXISTS quotes_fts_ai',
+        'DROP TRIGGER IF EXISTS quotes_fts_ad',
+        'DROP TRIGGER IF EXISTS quotes_fts_au',
+        'DROP TABLE IF EXISTS quotes_fts',
+        # user_id is indexed as a token: "user_id:123 AND (...)" intersects
+        # doclists, so only that user's matches are ranked
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+            message_text,
+            author_name,
+            user_id,
+            content='quotes',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_ai AFTER INSERT ON quotes BEGIN
+            INSERT INTO quotes_fts (rowid, message_text, author_name, user_id)
+            VALUES (new.id, new.message_text, new.author_name, new.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_ad AFTER DELETE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, message_text, author_name, user_id)
+            VALUES ('delete', old.id, old.message_text, old.author_name, old.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS quotes_fts_au AFTER UPDATE OF message_text, author_name, user_id ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, message_text, author_name, user_id)
+            VALUES ('delete', old.id, old.message_text, old.author_name, old.user_id);
+            INSERT INTO quotes_fts (rowid, message_text, author_name, user_id)
+            VALUES (new.id, new.message_text, new.author_name, new.user_id);
+        END
+        ''',
+        "INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild')",
+    ]),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    """Apply pending migrations in order, each one in its own transaction"""
+    conn.commit()
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+
+        # IMMEDIATE takes the write lock up front, so two processes starting
+        # at once can't both apply the same step
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        current = version
+        logging.info(f"Applied migration {version}: {description}")
+
+    return current
@@ -1,111 +1,167 @@
+from telebot.apihelper import ApiTelegramException
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-import os
 import logging
-import yt_dlp
 
 from database import Database
 from config import Config
+from media_jobs import MediaJobScheduler, QueueFull
+from search_sessions import SearchSessionStore
+from extractors import ExtractorPool
+from media_pipeline import MediaPipeline
+from prefetch import MenuPrefetcher
 
 
+# The only search result fields the menus and downloads use
+SEARCH_FIELDS = ('id', 'title', 'uploader', 'duration', 'webpage_url')
+
+
+def normalize_query(query):
+    """Cache key form of a search query: case- and whitespace-insensitive"""
+    return ' '.join(query.casefold().split())
+
 
 class MusicManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        os.makedirs(Config.MUSIC_DIR, exist_ok=True)
-        self._search_cache = {}
+        self.db = Database.shared()
+        self.jobs = MediaJobScheduler.shared(bot)
+        self.extractors = ExtractorPool.shared()
+        self.pipeline = MediaPipeline(self.extractors)
+        self.prefetcher = MenuPrefetcher(self.pipeline, self.db)
+        self.sessions = SearchSessionStore(on_expire=self.prefetcher.discard)
+    
+    def _submit(self, user_id, chat_id, func, *args, status):
+        """Queue heavy yt-dlp work on the media scheduler"""
+        try:
+            self.jobs.submit(user_id, chat_id, func, *args, status=status)
+            return True
+        except QueueFull:
+            self.bot.edit_message_text(
+                "⏳ Очередь загрузок переполнена, попробуйте позже.",
+                status.chat.id,
+                status.message_id
+            )
+            return False
+    
+    def queue_download(self, call, info, prefetch=None):
+        """Download a chosen track on the media scheduler; a reply under the menu shows progress"""
+        submitted = False
+        try:
+            # Already delivered once: resend by file_id without taking a media worker
+            if self.send_delivered(call.message, info):
+                self.bot.send_message(call.message.chat.id, "✅ Музыка жіберілді!")
+            else:
+                # The menu stays as it is, so more tracks can be picked from it
+                status = self.bot.reply_to(call.message, f"⬬ Жүктелуде: {info.get('title') or 'Без названия'}")
+                submitted = self._submit(call.from_user.id, call.message.chat.id, self.download_from_info,
+                                         status, info, prefetch, status=status)
+        finally:
+            if prefetch and not submitted:
+                prefetch.cancel()
         
-    def download_from_info(self, message, info):
+    def send_delivered(self, message, info):
+        """Resend a track delivered before (to any chat) by its file_id; False if unknown or rejected"""
+        video_id = info.get('id')
+        delivered = video_id and self.db.get_delivered_media(video_id, 'audio')
+        if not delivered:
+            return False
+
+        file_id, title, performer = delivered
         try:
+            self.bot.send_audio(message.chat.id, file_id, title=title, performer=performer)
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            # Bad or expired file_id: forget it and download again
+            logging.warning(f"Delivered file_id for {video_id} rejected: {e.description}")
+            self.db.delete_delivered_media(video_id, 'audio')
+            return False
+
+        self.db.add_music(user_id=message.chat.id, title=title, artist=performer, file_id=file_id)
+        return True
+        
+    def download_from_info(self, message, info, prefetch=None):
+        """Send the track to message's chat; returns the final status text"""
+        try:
+            if self.send_delivered(message, info):
+                return "✅ Музыка жіберілді!"
+
             title = info.get('title', 'Unknown')
             uploader = info.get('uploader', 'Unknown Artist')
             url = info.get('webpage_url')
 
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'{Config.MUSIC_DIR}/%(title)s.%(ext)s',
-                'quiet': True,
-                'no_warnings': True,
-                'cookiefile': 'cookies.txt',
-                'geo_bypass': True,
-                'geo_bypass_country': 'KZ',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                filename = ydl.prepare_filename(info)
-                audio_filename = os.path.splitext(filename)[0] + '.mp3'
-
-            if os.path.exists(audio_filename):
-                with open(audio_filename, 'rb') as audio_file:
-                    sent = self.bot.send_audio(
-                        message.chat.id,
-                        audio_file,
-                        title=title,
-                        performer=uploader
-                    )
-
-                self.db.add_music(
-                    user_id=message.chat.id,
+            # Speculative work from while the menu was shown: a resolved format, maybe the audio itself
+            resolved, media = (prefetch and prefetch.result()) or (None, None)
+            # Otherwise a fresh extraction: cached entries only carry a few fields
+            with media or self.pipeline.open(url, 'music-audio', 'audio', mp3=Config.MUSIC_AUDIO_MODE == 'mp3',
+                                             resolved=resolved) as media:
+                sent = self.bot.send_audio(
+                    message.chat.id,
+                    media.upload,
                     title=title,
-                    artist=uploader,
-                    file_path=audio_filename,
-                    file_id=sent.audio.file_id if sent.audio else None
+                    performer=uploader
                 )
 
-                self.bot.send_message(message.chat.id, "✅ Музыка жіберілді!")
-                os.remove(audio_filename)
-
-            else:
-                self.bot.send_message(message.chat.id, "❌ Файл табылмады!")
+            self.db.add_music(
+                user_id=message.chat.id,
+                title=title,
+                artist=uploader,
+                file_path=None,  # nothing is kept on disk; resends go by file_id
+                file_id=sent.audio.file_id if sent.audio else None
+            )
+            if sent.audio and info.get('id'):
+                self.db.add_delivered_media(info['id'], 'audio', sent.audio.file_id, title, uploader)
+            return "✅ Музыка жіберілді!"
 
         except Exception as e:
             logging.error(f"Error downloading selected music: {e}")
-            self.bot.send_message(message.chat.id, "❌ Қате орын алды!")
+            return "❌ Қате орын алды!"
+        finally:
+            if prefetch:
+                prefetch.cancel()
+
+    def search(self, query, depth):
+        """Top depth search results as compact dicts, from the SQLite cache when possible"""
+        key = normalize_query(query)
+        entries = self.db.get_music_search(key, depth)
+        if entries is not None:
+            return entries
+
+        with self.extractors.acquire('music-search') as ydl:
+            info = ydl.extract_info(f'ytsearch{depth}:{query}', download=False)
+
+        entries = [
+            {field: entry.get(field) for field in SEARCH_FIELDS}
+            for entry in (info or {}).get('entries') or []
+            if entry and entry.get('webpage_url')
+        ]
+        # Empty results aren't cached: a transient failure shouldn't stick for days
+        if entries:
+            self.db.put_music_search(key, depth, entries)
+        return entries
 
     def search_music_list(self, message, query):
         """Музыка іздеу (қысқаша жауаппен 1-2 ән)"""
         
         try:
-            self.bot.reply_to(message, "🔍 Іздеудемін...")
-
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'cookiefile': 'cookies.txt', 
-                'default_search': 'ytsearch1',
-                'retries': 10,              # 👈 қайта көру
-                'fragment_retries': 10, 
-                'outtmpl': f'{Config.MUSIC_DIR}/%(title)s.%(ext)s',
-                'nooverwrites': True,
-                'geo_bypass': True,
-                'geo_bypass_country': 'KZ',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(query, download=False)
-
-            if not info or 'entries' not in info or len(info['entries']) == 0:
-                self.bot.reply_to(message, "❌ Музыка табылмады!")
-                return
-
-            entry = info['entries'][0]
-            self.download_from_info(message, entry)
-
+            status = self.bot.reply_to(message, "🔍 Іздеудемін...")
+            self._submit(message.from_user.id, message.chat.id, self._search_and_download, message, query, status=status)
         except Exception as e:
             logging.error(f"Error in search_music_list: {e}")
             self.bot.reply_to(message, "❌ Қате орын алды!")
+    
+    def _search_and_download(self, message, query):
+        """Find the first match for query and send it (runs on a media worker)"""
+        try:
+            entries = self.search(query, 1)
+            if not entries:
+                return "❌ Музыка табылмады!"
+
+            return self.download_from_info(message, entries[0])
+
+        except Exception as e:
+            logging.error(f"Error in _search_and_download: {e}")
+            return "❌ Қате орын алды!"
             
     
 
@@ -114,114 +170,61 @@ class MusicManager:
         """Музыка іздеу, 5-6 нұсқасын көрсетеді меню түрінде"""
     
         try:
-            self.bot.reply_to(message, "🔍 Музыкалар ізделуде...")
-
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'geo_bypass': True,
-                'geo_bypass_country': 'KZ',
-                'cookiefile': 'cookies.txt', 
-                'default_search': 'ytsearch5',
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(query, download=False)
-
-            if not info or 'entries' not in info or len(info['entries']) == 0:
-                self.bot.reply_to(message, "❌ Музыка табылмады!")
-                return
+            status = self.bot.reply_to(message, "🔍 Музыкалар ізделуде...")
+            self._submit(message.from_user.id, message.chat.id, self._search_options, message, query, status, status=status)
+        except Exception as e:
+            logging.error(f"Error in show_music_options: {e}")
+            self.bot.reply_to(message, "❌ Қате орын алды!")
+    
+    def _search_options(self, message, query, status):
+        """Search five matches and turn the status message into a menu (runs on a media worker)"""
+        try:
+            entries = self.search(query, 5)
+            if not entries:
+                return "❌ Музыка табылмады!"
 
+            # The menu is the status message itself, so its id is the session key
+            token = self.sessions.create(status.chat.id, status.message_id, message.from_user.id, entries)
             keyboard = InlineKeyboardMarkup()
-            self._search_cache = {}
 
             text = "🎧 Найдено:\n\n"
-            for i, entry in enumerate(info['entries'], 1):
-                title = entry.get('title', 'Без названия')
-                uploader = entry.get('uploader', 'Неизвестно')
+            for i, entry in enumerate(entries, 1):
+                title = entry.get('title') or 'Без названия'
+                uploader = entry.get('uploader') or 'Неизвестно'
                 text += f"{i}. {title} — {uploader}\n"
-                callback_data = f"music_choose_{i}"
-                self._search_cache[callback_data] = {
-                    'info': entry,
-                    'user_id': message.from_user.id
-                }
-                keyboard.add(InlineKeyboardButton(f"🎵 {i}", callback_data=callback_data))
+                keyboard.add(InlineKeyboardButton(f"🎵 {i}", callback_data=f"music_choose_{token}_{i}"))
 
-            self.bot.send_message(message.chat.id, text, reply_markup=keyboard)
+            self.bot.edit_message_text(text, status.chat.id, status.message_id, reply_markup=keyboard)
+            self.prefetcher.start(status.chat.id, status.message_id, entries)
 
         except Exception as e:
-            logging.error(f"Error in show_music_options: {e}")
-            self.bot.reply_to(message, "❌ Қате орын алды!")
-
-
+            logging.error(f"Error in _search_options: {e}")
+            return "❌ Қате орын алды!"
 
     def handle_music_selection(self, call):
+        """Menu button music_choose_<token>_<n>: download that entry for the menu's owner"""
         try:
-            parts = call.data.split("_")
-            idx = int(parts[2]) - 1
-            user_id = int(parts[3])
+            parts = call.data.split('_')
+            # Menus from before a restart (or the old music_choose_<n> format) have no session
+            session = len(parts) == 4 and self.sessions.get(call.message.chat.id, call.message.message_id, parts[2])
+            if not session:
+                self.bot.answer_callback_query(call.id, "❌ Бұл сілтеме ескірген.")
+                return
 
+            user_id, entries = session
             if call.from_user.id != user_id:
                 self.bot.answer_callback_query(call.id, "❗ Это не ваш запрос.")
                 return
 
-            results = self._search_cache.get(user_id)
-            if not results or idx >= len(results):
+            idx = int(parts[3]) - 1
+            if not 0 <= idx < len(entries):
                 self.bot.answer_callback_query(call.id, "❌ Истекло время выбора.")
                 return
 
-            video = results[idx]
-            title = video.get('title', 'Unknown')
-            uploader = video.get('uploader', 'Unknown Artist')
-            url = video['webpage_url']
-
-            self.bot.edit_message_text(
-                f"⬬ Скачиваю: *{title}* - *{uploader}*...",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown"
-            )
-
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'{Config.MUSIC_DIR}/%(title)s.%(ext)s',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                    'geo_bypass': True,
-                    'geo_bypass_country': 'KZ',
-                }],
-                'quiet': True,
-                'no_warnings': True,
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                filename = ydl.prepare_filename(video)
-                mp3_file = os.path.splitext(filename)[0] + '.mp3'
-
-            if os.path.exists(mp3_file):
-                with open(mp3_file, 'rb') as audio:
-                    sent = self.bot.send_audio(
-                        call.message.chat.id,
-                        audio,
-                        title=title,
-                        performer=uploader
-                    )
-                self.bot.edit_message_text(
-                    "✅ Музыка отправлена!",
-                    call.message.chat.id,
-                    call.message.message_id
-                )
-                try:
-                    os.remove(mp3_file)
-                except:
-                    pass
-            else:
-                self.bot.edit_message_text("❌ Ошибка при скачивании!", call.message.chat.id, call.message.message_id)
+            self.bot.answer_callback_query(call.id)
+            prefetch = self.prefetcher.claim(call.message.chat.id, call.message.message_id, idx)
+            self.queue_download(call, entries[idx], prefetch)
 
         except Exception as e:
             logging.error(f"Error in handle_music_selection: {e}", exc_info=True)
-            self.bot.edit_message_text("❌ Ошибка при обработке!", call.message.chat.id, call.message.message_id)
+            self.bot.answer_callback_query(call.id, "❌ Ошибка при обработке!")
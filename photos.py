@@ -2,12 +2,12 @@ import os
 import logging
 from database import Database
 from config import Config
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultPhoto, InputMediaPhoto
 
 class PhotoManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = Database.shared()
         
         # Create photos directory if it doesn't exist
         os.makedirs(Config.PHOTOS_DIR, exist_ok=True)
@@ -25,6 +25,10 @@ class PhotoManager:
                 self.bot.reply_to(message, "❌ Ответьте на фотографию!")
                 return
             
+            if self.db.get_usage(message.from_user.id, 'photos') >= Config.MAX_PHOTOS_PER_USER:
+                self.bot.reply_to(message, f"❌ Достигнут лимит в {Config.MAX_PHOTOS_PER_USER} фотографий!")
+                return
+            
             # Get the largest photo
             photo = replied_msg.photo[-1]
             
@@ -73,59 +77,140 @@ class PhotoManager:
             self.bot.reply_to(message, "❌ Произошла ошибка при сохранении фотографии!")
     
     def show_user_photos(self, message):
-        """Show user's saved photos"""
+        """Show user's saved photos as a media-group gallery"""
         try:
-            user_photos = self.db.get_user_photos(message.from_user.id)
-            
-            if not user_photos:
+            total = self.db.get_usage(message.from_user.id, 'photos')
+            if not total:
                 self.bot.reply_to(message, "📷 У вас пока нет сохраненных фотографий!")
                 return
             
-            self.bot.reply_to(message, f"📷 Найдено {len(user_photos)} сохраненных фотографий:")
-            
-            # Send photos with descriptions
-            for photo_data in user_photos[:10]:  # Limit to 10 photos to avoid spam
-                photo_id, user_id, file_id, description, file_path, created_at = photo_data
-                
-                try:
-                    caption_text = f"📸 Фото #{photo_id}"
-                    if description:
-                        caption_text += f"\n📝 {description}"
-                    caption_text += f"\n🕒 {created_at}"
-                    
-                    keyboard = InlineKeyboardMarkup()
-                    keyboard.add(InlineKeyboardButton("🗑 Удалить", callback_data=f"delete_photo_{photo_id}"))
-                    
-                    self.bot.send_photo(
-                        message.chat.id,
-                        file_id,
-                        caption=caption_text,
-                        reply_markup=keyboard
-                    )
-                    
-                except Exception as e:
-                    logging.error(f"Error sending photo {photo_id}: {e}")
-                    continue
-            
-            if len(user_photos) > 10:
-                self.bot.send_message(message.chat.id, f"... и еще {len(user_photos) - 10} фотографий")
+            self.bot.reply_to(message, f"📷 Найдено {total} сохраненных фотографий:")
+            self._send_photos_page(message.chat.id, message.from_user.id, total)
                 
         except Exception as e:
             logging.error(f"Error in show_user_photos: {e}")
             self.bot.reply_to(message, "❌ Ошибка при получении фотографий!")
     
+    def handle_photos_page(self, call):
+        """"More" button under a gallery page: photos_page_<user>_<shown>_<id>_<created_at>"""
+        try:
+            _, _, user_id, shown, photo_id, created_at = call.data.split('_', 5)
+            user_id = int(user_id)
+            if call.from_user.id != user_id:
+                self.bot.answer_callback_query(call.id, "❗ Это не ваша галерея.")
+                return
+            
+            # The previous page keeps its delete buttons but loses "more"
+            self.bot.edit_message_reply_markup(
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=self._without_button(call.message.reply_markup, call.data)
+            )
+            total = self.db.get_usage(user_id, 'photos')
+            if not self._send_photos_page(call.message.chat.id, user_id, total, (created_at, int(photo_id)), int(shown)):
+                self.bot.answer_callback_query(call.id, "📷 Больше фотографий нет")
+                return
+            self.bot.answer_callback_query(call.id)
+            
+        except Exception as e:
+            logging.error(f"Error in handle_photos_page: {e}")
+            self.bot.answer_callback_query(call.id, "❌ Ошибка при получении фотографий!")
+    
+    def _send_photos_page(self, chat_id, user_id, total, after=None, shown=0):
+        """Send one page as a media group plus a message with delete and "more" buttons"""
+        page_size = Config.PHOTOS_PAGE_SIZE
+        rows = self.db.get_user_photos_page(user_id, page_size + 1, after)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not rows:
+            return False
+        
+        if len(rows) == 1:
+            # Media groups need at least two items
+            self.bot.send_photo(chat_id, rows[0][2], caption=self._caption(rows[0]))
+        else:
+            self.bot.send_media_group(chat_id, [
+                InputMediaPhoto(row[2], caption=self._caption(row)) for row in rows
+            ])
+        
+        keyboard = InlineKeyboardMarkup(row_width=5)
+        keyboard.add(*[
+            InlineKeyboardButton(f"🗑 #{row[0]}", callback_data=f"delete_photo_{row[0]}")
+            for row in rows
+        ])
+        if has_more:
+            last_id, created_at = rows[-1][0], rows[-1][5]
+            keyboard.row(InlineKeyboardButton(
+                "Ещё ▶️",
+                callback_data=f"photos_page_{user_id}_{shown + len(rows)}_{last_id}_{created_at}"
+            ))
+        self.bot.send_message(
+            chat_id,
+            f"📷 Фото {shown + 1}–{shown + len(rows)} из {max(total, shown + len(rows))}",
+            reply_markup=keyboard
+        )
+        return True
+    
+    def _caption(self, photo_data):
+        photo_id, user_id, file_id, description, file_path, created_at = photo_data
+        caption_text = f"📸 Фото #{photo_id}"
+        if description:
+            caption_text += f"\n📝 {description}"
+        caption_text += f"\n🕒 {created_at}"
+        return caption_text
+    
+    def _without_button(self, markup, callback_data):
+        """Copy of an inline keyboard minus the button with callback_data"""
+        keyboard = InlineKeyboardMarkup()
+        for row in (markup.keyboard if markup else []):
+            kept = [button for button in row if button.callback_data != callback_data]
+            if kept:
+                keyboard.row(*kept)
+        return keyboard
+    
+    def inline_results(self, query):
+        """Build inline results for "photos" queries"""
+        user_photos = self.db.get_user_photos_page(query.from_user.id, 10)  # Limit to 10 results
+        
+        results = []
+        for photo in user_photos:
+            result = InlineQueryResultPhoto(
+                id=str(photo[0]),
+                photo_url=f"https://api.telegram.org/file/bot{Config.BOT_TOKEN}/{photo[1]}",
+                thumb_url=f"https://api.telegram.org/file/bot{Config.BOT_TOKEN}/{photo[1]}",
+                caption=photo[2] if photo[2] else f"Фото #{photo[0]}"
+            )
+            results.append(result)
+        return results
+    
     def handle_delete_photo(self, call):
         """Handle photo deletion"""
         try:
             photo_id = int(call.data.split('_')[2])
             
-            # In a real implementation, you would delete from database and filesystem
-            self.bot.edit_message_caption(
-                "✅ Фотография удалена!",
-                call.message.chat.id,
-                call.message.message_id
-            )
+            file_path = self.db.delete_photo(photo_id, call.from_user.id)
+            if file_path is None:
+                self.bot.answer_callback_query(call.id, "❌ Фотография не найдена!")
+                return
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            
+            if call.message.photo:
+                # Single photo message with its own button
+                self.bot.edit_message_caption(
+                    "✅ Фотография удалена!",
+                    call.message.chat.id,
+                    call.message.message_id
+                )
+            else:
+                # Gallery page: drop this photo's button
+                self.bot.edit_message_reply_markup(
+                    call.message.chat.id,
+                    call.message.message_id,
+                    reply_markup=self._without_button(call.message.reply_markup, call.data)
+                )
+            self.bot.answer_callback_query(call.id, "✅ Фотография удалена!")
             
         except Exception as e:
             logging.error(f"Error deleting photo: {e}")
-            self.bot.answer_callback_query(call.id, "❌ Ошибка при удалении фотографии!")
\ No newline at end of file
+            self.bot.answer_callback_query(call.id, "❌ Ошибка при удалении фотографии!")
@@ -0,0 +1,237 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+PREFETCH_MODES = ('off', 'resolve', 'download')
+
+
+class Prefetch:
+    """Speculative work for one menu entry: its resolved format and, in download mode, the audio"""
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.state = 'queued'  # queued -> running -> done / failed / cancelled
+        self.resolved = None  # (info, headers) from MediaPipeline.resolve()
+        self.media = None  # MediaFile, download mode only
+        self.size = 0  # bytes in media
+        self.claimed = False  # handed to a download: no longer counted or released by the prefetcher
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    def result(self):
+        """Wait for the prefetch; (resolved, media) with media handed over to the caller, or None"""
+        self.finished.wait()
+        if self.state != 'done':
+            return None
+        media, self.media = self.media, None
+        return self.resolved, media
+
+    def cancel(self):
+        """Stop the work and drop buffered audio nobody took"""
+        self.cancelled.set()
+        if self.finished.is_set():
+            self.release()
+
+    def release(self):
+        media, self.media = self.media, None
+        if media is not None:
+            media.file.close()
+
+
+class MenuPrefetcher:
+    """Resolves, and optionally downloads, the top entries of a music menu while it is on screen
+
+    start() is called when a menu is shown; tasks run on a few dedicated
+    threads so speculative work never takes a media worker. claim() hands
+    the chosen entry's task to the download and cancels the rest of the
+    menu. Tracks already in delivered_media are skipped (they are resent by
+    file_id). Each chat holds at most PREFETCH_PER_CHAT entries, and menus
+    are dropped when their session expires or is evicted, or by a timer
+    once their TTL is over. Buffered audio stays in memory only up to
+    PREFETCH_SPOOL_BYTES per track, and all of it together stays under
+    PREFETCH_TOTAL_BYTES: the oldest buffers are released first (their
+    resolved formats are kept).
+    """
+
+    def __init__(self, pipeline, db, mode=None, mp3=None, top=None, per_chat=None, max_menus=None, ttl=None,
+                 max_total_bytes=None):
+        self.pipeline = pipeline
+        self.db = db
+        self.mode = mode or Config.PREFETCH_MODE
+        if self.mode not in PREFETCH_MODES:
+            raise ValueError(f"Unknown prefetch mode: {self.mode}")
+        self.mp3 = mp3 if mp3 is not None else Config.MUSIC_AUDIO_MODE == 'mp3'
+        self.top = top or Config.PREFETCH_TOP
+        self.per_chat = per_chat or Config.PREFETCH_PER_CHAT
+        self.max_menus = max_menus or Config.PREFETCH_MENUS
+        self.ttl = ttl or Config.MUSIC_SESSION_TTL
+        self.max_total_bytes = max_total_bytes or Config.PREFETCH_TOTAL_BYTES
+        self._menus = {}  # (chat_id, message_id) -> (expires_at, {index: Prefetch})
+        self._held = {}  # Prefetch with buffered media -> its size, oldest first
+        self._held_bytes = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._timer = None
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def start(self, chat_id, message_id, entries):
+        """Prefetch the top entries of a menu that was just shown"""
+        if not self.enabled:
+            return
+        candidates = [
+            (index, entry) for index, entry in enumerate(entries[:self.top])
+            if entry.get('webpage_url')
+            and not (entry.get('id') and self.db.get_delivered_media(entry['id'], 'audio'))
+        ]
+
+        dropped = []
+        with self._lock:
+            dropped += self._expired(time.monotonic())
+            held = sum(len(tasks) for (chat, _), (_, tasks) in self._menus.items() if chat == chat_id)
+            tasks = {index: Prefetch(entry) for index, entry in candidates[:max(self.per_chat - held, 0)]}
+            if tasks:
+                while len(self._menus) >= self.max_menus:
+                    dropped += self._menus.pop(next(iter(self._menus)))[1].values()
+                self._menus[(chat_id, message_id)] = (time.monotonic() + self.ttl, tasks)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(Config.PREFETCH_WORKERS, thread_name_prefix='prefetch')
+                for task in tasks.values():
+                    self._executor.submit(self._run, task)
+                self.started += len(tasks)
+                self._schedule_expiry()
+        self._drop(dropped)
+
+    def claim(self, chat_id, message_id, index):
+        """The chosen entry's Prefetch (queued ones are cancelled instead), or None"""
+        with self._lock:
+            dropped = self._expired(time.monotonic())
+            menu = self._menus.pop((chat_id, message_id), None)
+            task = None
+            if menu is not None:
+                task = menu[1].pop(index, None)
+                dropped += menu[1].values()
+            if task is not None and task.state == 'queued':
+                # Not started yet: the download does the work itself rather than wait in line
+                task.cancelled.set()
+                self.wasted += 1
+                task = None
+            if task is not None:
+                self.used += 1
+                # The download owns the buffer from here on
+                task.claimed = True
+                self._unhold(task)
+        self._drop(dropped)
+        return task
+
+    def discard(self, chat_id, message_id):
+        """Cancel a menu's prefetches (its session expired or was evicted)"""
+        with self._lock:
+            dropped = self._expired(time.monotonic())
+            menu = self._menus.pop((chat_id, message_id), None)
+            if menu is not None:
+                dropped += menu[1].values()
+        self._drop(dropped)
+
+    def shutdown(self):
+        with self._lock:
+            tasks = [task for _, menu in self._menus.values() for task in menu.values()]
+            self._menus.clear()
+            executor, self._executor = self._executor, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._drop(tasks)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            menus = len(self._menus)
+            held = self._held_bytes
+        return {'menus': menus, 'started': self.started, 'used': self.used, 'wasted': self.wasted,
+                'held_bytes': held}
+
+    def _run(self, task):
+        with self._lock:
+            if task.cancelled.is_set():
+                task.state = 'cancelled'
+                task.finished.set()
+                return
+            task.state = 'running'
+
+        url = task.entry['webpage_url']
+        try:
+            task.resolved = self.pipeline.resolve(url, 'music-audio')
+            if self.mode == 'download':
+                info, headers = task.resolved
+                try:
+                    task.media = self.pipeline.spool(info, headers, 'audio', self.mp3, task.cancelled,
+                                                     min(Config.PREFETCH_MAX_BYTES, self.max_total_bytes),
+                                                     Config.PREFETCH_SPOOL_BYTES)
+                    task.size = task.media.file.tell() if task.media else 0
+                except Exception as e:
+                    # Cancelled, too big to hold or a network error: the resolved format still helps
+                    logging.info(f"Prefetch download of {url} stopped: {e}")
+            task.state = 'done'
+        except Exception as e:
+            logging.warning(f"Prefetch of {url} failed: {e}")
+            task.state = 'failed'
+        finally:
+            with self._lock:
+                task.finished.set()
+                if task.cancelled.is_set():
+                    task.release()
+                elif task.media is not None and not task.claimed:
+                    self._hold(task)
+
+    def _hold(self, task):
+        """Count a finished buffer, then release the oldest ones over the total (caller holds the lock)"""
+        self._held[task] = task.size
+        self._held_bytes += task.size
+        while self._held_bytes > self.max_total_bytes:
+            oldest = next(iter(self._held))
+            self._unhold(oldest)
+            oldest.release()
+            logging.info(f"Prefetch buffer of {oldest.entry.get('webpage_url')} released: over "
+                         f"{self.max_total_bytes} bytes in total")
+
+    def _unhold(self, task):
+        self._held_bytes -= self._held.pop(task, 0)
+
+    def _expired(self, now):
+        """Pop menus past their TTL (caller holds the lock); returns their tasks"""
+        expired = [key for key, (expires_at, _) in self._menus.items() if expires_at <= now]
+        return [task for key in expired for task in self._menus.pop(key)[1].values()]
+
+    def _schedule_expiry(self):
+        """Wake up when the oldest menu expires, so idle menus don't hold buffers (caller holds the lock)"""
+        if self._timer is None and self._menus:
+            delay = min(expires_at for expires_at, _ in self._menus.values()) - time.monotonic()
+            self._timer = threading.Timer(max(delay, 0) + 1, self._expire_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire_due(self):
+        with self._lock:
+            self._timer = None
+            if self._executor is None:
+                return  # shut down
+            dropped = self._expired(time.monotonic())
+            self._schedule_expiry()
+        self._drop(dropped)
+
+    def _drop(self, tasks):
+        for task in tasks:
+            with self._lock:
+                self.wasted += 1
+                self._unhold(task)
+                task.cancel()
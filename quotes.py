@@ -1,12 +1,18 @@
 import logging
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent
 from database import Database
-import random
+from cache import LRUCache
+from config import Config
 
 class QuoteManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
+        self.db = Database.shared()
+        self.text_cache = LRUCache(
+            max_entries=Config.QUOTE_CACHE_ENTRIES,
+            max_bytes=Config.QUOTE_CACHE_BYTES,
+            ttl=Config.QUOTE_CACHE_TTL
+        )
     
     def create_quote_type1(self, message_text, author_name):
         """Create simple text quote (Type 1)"""
@@ -34,6 +40,10 @@ class QuoteManager:
                 self.bot.reply_to(message, "❌ Можно цитировать только текстовые сообщения!")
                 return
             
+            if self.db.get_usage(message.from_user.id, 'quotes') >= Config.MAX_QUOTES_PER_USER:
+                self.bot.reply_to(message, f"❌ Достигнут лимит в {Config.MAX_QUOTES_PER_USER} цитат! Удалите старые цитаты.")
+                return
+            
             # Add to database
             quote_id = self.db.add_quote(
                 user_id=message.from_user.id,
@@ -64,19 +74,19 @@ class QuoteManager:
     def handle_my_quote(self, message, quote_number=None):
         """Handle user's quotes"""
         try:
-            user_quotes = self.db.get_user_quotes(message.from_user.id)
-            
-            if not user_quotes:
-                self.bot.reply_to(message, "📝 У вас пока нет сохраненных цитат!")
-                return
-            
             if quote_number is None:
-                quote = random.choice(user_quotes)
+                quote = self.db.get_random_user_quote(message.from_user.id)
+                if not quote:
+                    self.bot.reply_to(message, "📝 У вас пока нет сохраненных цитат!")
+                    return
             else:
-                if quote_number > len(user_quotes) or quote_number < 1:
-                    self.bot.reply_to(message, f"❌ Цитата #{quote_number} не найдена! У вас всего {len(user_quotes)} цитат.")
+                quote, total = self.db.get_user_quote_by_number(message.from_user.id, quote_number)
+                if not total:
+                    self.bot.reply_to(message, "📝 У вас пока нет сохраненных цитат!")
+                    return
+                if not quote:
+                    self.bot.reply_to(message, f"❌ Цитата #{quote_number} не найдена! У вас всего {total} цитат.")
                     return
-                quote = user_quotes[quote_number - 1]
             
             quote_text = self.format_quote_from_db(quote)
             
@@ -92,19 +102,19 @@ class QuoteManager:
     def handle_chat_quote(self, message, quote_number=None):
         """Handle chat quotes"""
         try:
-            chat_quotes = self.db.get_chat_quotes(message.chat.id)
-            
-            if not chat_quotes:
-                self.bot.reply_to(message, "📝 В этом чате пока нет сохраненных цитат!")
-                return
-            
             if quote_number is None:
-                quote = random.choice(chat_quotes)
+                quote = self.db.get_random_chat_quote(message.chat.id)
+                if not quote:
+                    self.bot.reply_to(message, "📝 В этом чате пока нет сохраненных цитат!")
+                    return
             else:
-                if quote_number > len(chat_quotes) or quote_number < 1:
-                    self.bot.reply_to(message, f"❌ Цитата #{quote_number} не найдена! В чате всего {len(chat_quotes)} цитат.")
+                quote, total = self.db.get_chat_quote_by_number(message.chat.id, quote_number)
+                if not total:
+                    self.bot.reply_to(message, "📝 В этом чате пока нет сохраненных цитат!")
+                    return
+                if not quote:
+                    self.bot.reply_to(message, f"❌ Цитата #{quote_number} не найдена! В чате всего {total} цитат.")
                     return
-                quote = chat_quotes[quote_number - 1]
             
             quote_text = self.format_quote_from_db(quote)
             self.bot.send_message(message.chat.id, quote_text)
@@ -130,13 +140,75 @@ class QuoteManager:
             self.bot.reply_to(message, "❌ Ошибка при получении цитаты!")
     
     def format_quote_from_db(self, quote):
-        """Format quote from database record"""
+        """Format quote from database record (cached by quote id)"""
         quote_id, user_id, chat_id, message_text, author_name, author_id, quote_type, created_at = quote
         
-        if quote_type == 2:
-            return self.create_quote_type2(message_text, author_name)
+        text = self.text_cache.get(quote_id)
+        if text is None:
+            if quote_type == 2:
+                text = self.create_quote_type2(message_text, author_name)
+            else:
+                text = self.create_quote_type1(message_text, author_name)
+            self.text_cache.set(quote_id, text)
+        return text
+    
+    def search_quotes(self, user_id, terms, offset=0, limit=10):
+        """Search user's quotes; returns (quotes, next_offset or None)"""
+        quotes = self.db.search_quotes(user_id, terms, limit=limit + 1, offset=offset)
+        if len(quotes) > limit:
+            return quotes[:limit], offset + limit
+        return quotes, None
+    
+    def inline_results(self, query):
+        """Build inline results for "цитаты [слова]"; returns (results, next_offset)"""
+        # "цитаты <слова>" searches, plain "цитаты" shows the newest quotes
+        terms = query.query[len('цитаты'):].strip()
+        next_offset = ''
+        if terms:
+            offset = int(query.offset) if query.offset.isdigit() else 0
+            user_quotes, next_page = self.search_quotes(query.from_user.id, terms, offset=offset)
+            if next_page is not None:
+                next_offset = str(next_page)
         else:
-            return self.create_quote_type1(message_text, author_name)
+            user_quotes = self.db.get_user_quotes(query.from_user.id, limit=10)
+        
+        results = []
+        for quote in user_quotes:
+            quote_text = self.format_quote_from_db(quote)
+            
+            result = InlineQueryResultArticle(
+                id=str(quote[0]),
+                title=f"Цитата #{quote[0]}",
+                description=quote[3][:100] + "..." if len(quote[3]) > 100 else quote[3],
+                input_message_content=InputTextMessageContent(quote_text)
+            )
+            results.append(result)
+        
+        if not results and not query.offset:
+            if terms:
+                result = InlineQueryResultArticle(
+                    id='no_matches',
+                    title="Ничего не найдено",
+                    description=f"Нет цитат со словами: {terms}",
+                    input_message_content=InputTextMessageContent(f"🔍 Цитаты по запросу «{terms}» не найдены")
+                )
+            else:
+                result = InlineQueryResultArticle(
+                    id='no_quotes',
+                    title="Нет сохраненных цитат",
+                    description="Создайте цитаты в чатах с ботом",
+                    input_message_content=InputTextMessageContent("📝 У меня пока нет сохраненных цитат!")
+                )
+            results.append(result)
+        
+        return results, next_offset
+    
+    def cache_stats(self):
+        """Hit/miss counters of quote page and formatted text caches"""
+        return {
+            'pages': self.db.cache_stats(),
+            'texts': self.text_cache.stats(),
+        }
     
     def handle_delete_quote(self, call):
         """Handle quote deletion"""
@@ -144,6 +216,7 @@ class QuoteManager:
             quote_id = int(call.data.split('_')[2])
             
             if self.db.delete_quote(quote_id, call.from_user.id):
+                self.text_cache.invalidate(quote_id)
                 self.bot.edit_message_text(
                     "✅ Цитата удалена!",
                     call.message.chat.id,
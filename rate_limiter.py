@@ -0,0 +1,214 @@
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+from telebot import apihelper
+
+from config import Config
+
+# Priority lanes: lower goes first when the global budget is short
+INTERACTIVE, MESSAGE, BULK = 0, 1, 2
+
+METHOD_LANES = {
+    'answerCallbackQuery': INTERACTIVE,
+    'answerInlineQuery': INTERACTIVE,
+    'editMessageText': INTERACTIVE,
+    'editMessageCaption': INTERACTIVE,
+    'editMessageMedia': INTERACTIVE,
+    'editMessageReplyMarkup': INTERACTIVE,
+    'deleteMessage': INTERACTIVE,
+    'sendChatAction': INTERACTIVE,
+    'sendMessage': MESSAGE,
+}
+
+# Not messages: never throttled
+UNLIMITED_METHODS = {
+    'getUpdates', 'getMe', 'getFile', 'getChat', 'getChatMember',
+    'setWebhook', 'deleteWebhook', 'getWebhookInfo', 'close', 'logOut',
+}
+
+
+class TokenBucket:
+    """rate tokens per second, up to capacity; reserve() hands out wait times"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now, weight=1):
+        """Take weight tokens (going into debt if needed); returns seconds to wait"""
+        self.refill(now)
+        self.tokens -= weight
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def idle(self, now):
+        self.refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class RateLimiter:
+    """Central scheduler for outbound Bot API requests
+
+    Every request goes through a per-chat bucket (20/min for groups, about
+    1/s for private chats) and then a global 30/s bucket. When the global
+    budget is short, waiting requests leave in lane order: edits and callback
+    answers first, then text messages, then media sends. A 429 pauses the
+    bucket it hit for retry_after seconds and the request is retried.
+    """
+
+    def __init__(self, global_rate=None, group_per_minute=None, private_rate=None, max_retries=None):
+        self.global_rate = global_rate or Config.RATE_GLOBAL_PER_SEC
+        self.group_rate = (group_per_minute or Config.RATE_GROUP_PER_MIN) / 60
+        self.private_rate = private_rate or Config.RATE_PRIVATE_PER_SEC
+        self.max_retries = max_retries if max_retries is not None else Config.RATE_MAX_RETRIES
+
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._chats_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (lane, seq)
+        self._seq = itertools.count()
+        self._make_request = None
+        self.throttled = 0
+        self.retried = 0
+
+    def install(self):
+        """Route every TeleBot request (apihelper._make_request) through the limiter"""
+        if self._make_request is None:
+            self._make_request = apihelper._make_request
+            apihelper._make_request = self.make_request
+        return self
+
+    def uninstall(self):
+        if self._make_request is not None:
+            apihelper._make_request = self._make_request
+            self._make_request = None
+
+    def make_request(self, token, method_name, method='get', params=None, files=None):
+        if method_name in UNLIMITED_METHODS:
+            return self._make_request(token, method_name, method, params=params, files=files)
+
+        chat_id = (params or {}).get('chat_id')
+        lane = METHOD_LANES.get(method_name, BULK)
+        weight = self._weight(method_name, params)
+        attempt = 0
+        while True:
+            self.acquire(chat_id, lane, weight)
+            try:
+                return self._make_request(token, method_name, method, params=params, files=files)
+            except apihelper.ApiTelegramException as e:
+                if e.error_code != 429 or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                logging.warning(f"Telegram 429 on {method_name} (chat {chat_id}), retrying in {retry_after}s")
+                self._pause(chat_id, retry_after)
+                self._rewind(files)
+
+    def acquire(self, chat_id, lane=BULK, weight=1):
+        """Block until chat_id and the global budget allow weight more messages"""
+        # Per-chat limits are about new messages; edits and answers skip them
+        if chat_id is not None and lane != INTERACTIVE:
+            # A private chat's ~1/s is per send: an album is one send there, not one per item
+            chat_weight = weight if self._is_group(chat_id) else 1
+            with self._chats_lock:
+                wait = self._chat_bucket(chat_id).reserve(time.monotonic(), chat_weight)
+            if wait > 0:
+                self.throttled += 1
+                time.sleep(wait)
+
+        entry = (lane, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiters[0] is entry:
+                        self._global.refill(now)
+                        wait = max(self._global.paused_until - now,
+                                   (min(weight, self._global.capacity) - self._global.tokens) / self.global_rate)
+                        if wait <= 0:
+                            self._global.tokens -= weight
+                            return
+                        self.throttled += 1
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._chats_lock:
+            chats = len(self._chats)
+        return {'throttled': self.throttled, 'retried': self.retried, 'chats': chats}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10000:
+                self._prune()
+            if self._is_group(chat_id):
+                bucket = TokenBucket(self.group_rate, Config.RATE_GROUP_BURST)
+            else:
+                bucket = TokenBucket(self.private_rate, Config.RATE_PRIVATE_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        """Drop buckets of chats that are fully refilled (nothing to remember)"""
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    def _pause(self, chat_id, seconds):
+        """Hold back the chat (or everything, without a chat) for retry_after"""
+        until = time.monotonic() + seconds
+        if chat_id is None:
+            with self._cond:
+                self._global.paused_until = max(self._global.paused_until, until)
+                self._cond.notify_all()
+            return
+        with self._chats_lock:
+            bucket = self._chat_bucket(chat_id)
+            bucket.paused_until = max(bucket.paused_until, until)
+        # Interactive requests skip the chat bucket, so the retrying caller waits here
+        time.sleep(seconds)
+
+    @staticmethod
+    def _rewind(files):
+        """Uploads are file objects; a retry must send them from the start again"""
+        for value in (files or {}).values():
+            file = value[1] if isinstance(value, tuple) else value
+            if hasattr(file, 'seek'):
+                file.seek(0)
+
+    @staticmethod
+    def _is_group(chat_id):
+        try:
+            return int(chat_id) < 0
+        except (TypeError, ValueError):
+            return True  # @channelusername
+
+    @staticmethod
+    def _weight(method_name, params):
+        """sendMediaGroup counts as one message per item (globally and in groups)"""
+        if method_name == 'sendMediaGroup':
+            try:
+                return max(len(json.loads(params['media'])), 1)
+            except (KeyError, TypeError, ValueError):
+                return 1
+        return 1
@@ -0,0 +1,84 @@
+import re
+from typing import NamedTuple, Optional, Callable
+
+# Video, vm.tiktok.com short and /t/ short links in one precompiled pattern
+TIKTOK_URL_RE = re.compile(
+    r'https?://(?:'
+    r'(?:www\.)?tiktok\.com/@[\w\.-]+/video/\d+'
+    r'|vm\.tiktok\.com/[\w\d]+'
+    r'|(?:www\.)?tiktok\.com/t/[\w\d]+'
+    r')'
+)
+
+
+class Route(NamedTuple):
+    kind: Optional[str]  # 'command', 'music_text', 'tiktok_url' or None
+    command: Optional[str] = None
+    handler: Optional[Callable] = None
+    url: Optional[str] = None
+
+
+NO_ROUTE = Route(None)
+
+
+class MessageRouter:
+    """Classifies each text message once and dispatches it from a table
+
+    Replaces a chain of per-handler filters: the command is looked up in a
+    dict, "муз ..." is a prefix check and TikTok links are found with one
+    precompiled alternation. The result is cached on the message as _route.
+    """
+
+    def __init__(self):
+        self._commands = {}  # command name -> handler
+        self._kinds = {}  # route kind -> handler
+
+    def command(self, *names):
+        """Decorator: handle /name (and /name@bot) commands"""
+        def decorator(handler):
+            for name in names:
+                self._commands[name.lower()] = handler
+            return handler
+        return decorator
+
+    def on(self, kind):
+        """Decorator: handle a non-command route kind ('music_text', 'tiktok_url')"""
+        def decorator(handler):
+            self._kinds[kind] = handler
+            return handler
+        return decorator
+
+    def classify(self, message):
+        route = getattr(message, '_route', None)
+        if route is not None:
+            return route
+
+        text = message.text
+        if not text:
+            route = NO_ROUTE
+        elif text[0] == '/':
+            name = text[1:].split(maxsplit=1)[0].split('@', 1)[0].lower() if len(text) > 1 else ''
+            handler = self._commands.get(name)
+            route = Route('command', name, handler) if handler else NO_ROUTE
+        elif text[:4].lower() == 'муз ':
+            route = Route('music_text', handler=self._kinds.get('music_text'))
+        elif 'tiktok.com' in text:
+            match = TIKTOK_URL_RE.search(text)
+            if match:
+                route = Route('tiktok_url', handler=self._kinds.get('tiktok_url'), url=match.group(0))
+            else:
+                route = NO_ROUTE
+        else:
+            route = NO_ROUTE
+
+        message._route = route
+        return route
+
+    def matches(self, message):
+        """Filter for the single bot handler: does any route handle this message?"""
+        return self.classify(message).handler is not None
+
+    def dispatch(self, message):
+        route = self.classify(message)
+        if route.handler:
+            route.handler(message)
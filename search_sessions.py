@@ -0,0 +1,44 @@
+import secrets
+
+from cache import LRUCache
+from config import Config
+
+
+class SearchSessionStore:
+    """Pending search menus keyed by (chat_id, message_id) of the menu message
+
+    Each menu gets a short random token that goes into its callback data, so
+    a button only resolves against the session it was created with. Sessions
+    expire after a TTL and the store is capped by entry count and bytes;
+    on_expire(chat_id, message_id) is called when one expires or is evicted.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, max_bytes=None, on_expire=None):
+        self._sessions = LRUCache(
+            max_entries=max_entries or Config.MUSIC_SESSION_ENTRIES,
+            max_bytes=max_bytes or Config.MUSIC_SESSION_BYTES,
+            ttl=ttl or Config.MUSIC_SESSION_TTL,
+            on_evict=(lambda key, value: on_expire(*key)) if on_expire else None
+        )
+
+    def create(self, chat_id, message_id, user_id, entries):
+        """Store a menu's entries; returns the token for its callback data"""
+        token = secrets.token_hex(4)
+        self._sessions.set((chat_id, message_id), (token, user_id, entries))
+        return token
+
+    def get(self, chat_id, message_id, token):
+        """(owner user_id, entries) of a live session, or None"""
+        session = self._sessions.get((chat_id, message_id))
+        if session is None or session[0] != token:
+            return None
+        return session[1], session[2]
+
+    def discard(self, chat_id, message_id):
+        self._sessions.pop((chat_id, message_id))
+
+    def stats(self):
+        return self._sessions.stats()
+
+    def __len__(self):
+        return len(self._sessions)
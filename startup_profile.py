@@ -0,0 +1,58 @@
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Import and init timings for `python bot.py --profile-startup`
+
+    watch_imports() times every import statement executed at the top level of
+    one module (cumulative, i.e. including what that import pulls in);
+    measure() times an init step. report() prints both in order.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = []  # (kind, name, seconds, new modules)
+        self._original_import = None
+        self._depth = 0
+
+    def watch_imports(self, module_name):
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if (self._depth or name in sys.modules
+                    or (globals or {}).get('__name__') != module_name):
+                return original(name, globals, locals, fromlist, level)
+            self._depth += 1
+            loaded = len(sys.modules)
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._depth -= 1
+                self.timings.append(('import', name, time.perf_counter() - started, len(sys.modules) - loaded))
+
+        builtins.__import__ = timed_import
+
+    def stop_imports(self):
+        if self._original_import:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def measure(self, kind, name):
+        loaded = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((kind, name, time.perf_counter() - started, len(sys.modules) - loaded))
+
+    def report(self):
+        lines = [f"{'step':<8} {'name':<28} {'ms':>9} {'modules':>8}"]
+        for kind, name, seconds, modules in self.timings:
+            lines.append(f"{kind:<8} {name:<28} {seconds * 1000:>9.1f} {modules:>8}")
+        lines.append(f"{'total':<8} {'':<28} {(time.perf_counter() - self.started) * 1000:>9.1f} {len(sys.modules):>8}")
+        return '\n'.join(lines)
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+
+class DatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.directory.name, 'bot.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def traced_plans(self, conn, call):
+        """EXPLAIN QUERY PLAN details of every SELECT run by call()"""
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            conn.set_trace_callback(None)
+        return [
+            row[3]
+            for sql in statements if sql.lstrip().upper().startswith('SELECT')
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')
+        ]
+
+
+class RandomRowTest(DatabaseTestCase):
+    def test_random_quote_does_not_scan(self):
+        for i in range(50):
+            self.db.add_quote(1, -1, f'quote {i}')
+        with self.db.pool.connection() as conn:
+            plans = self.traced_plans(conn, lambda: self.db._random_row(conn, 'quotes'))
+        self.assertTrue(plans)
+        # 'SCAN CONSTANT ROW' is the outer SELECT of the subqueries, not a table scan
+        scans = [plan for plan in plans if plan.startswith('SCAN') and plan != 'SCAN CONSTANT ROW']
+        self.assertFalse(scans, plans)
+
+
+class SearchQuotesTest(DatabaseTestCase):
+    def test_numeric_query_does_not_match_owner_id(self):
+        self.db.add_quote(1, -1, 'hello world')
+        self.db.add_quote(1, -1, 'room 12 is free')
+        self.db.add_quote(12, -1, 'hello from user twelve')
+
+        found = [quote[3] for quote in self.db.search_quotes(1, '1')]
+        self.assertEqual(found, ['room 12 is free'])
+        self.assertEqual(self.db.search_quotes(12, '12'), [])
+
+    def test_results_are_limited_to_the_owner(self):
+        self.db.add_quote(1, -1, 'hello world')
+        self.db.add_quote(2, -1, 'hello there')
+        self.assertEqual([quote[1] for quote in self.db.search_quotes(2, 'hello')], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
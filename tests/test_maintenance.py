@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import Database
+from maintenance import MaintenanceJob
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(Config, 'BACKUP_DIR', os.path.join(self.directory.name, 'backups'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = Database(os.path.join(self.directory.name, 'bot.db'))
+        self.job = MaintenanceJob(self.db, interval=0)
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def freelist_count(self):
+        with self.db.pool.connection() as conn:
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def test_compact_frees_every_page(self):
+        for i in range(500):
+            self.db.add_quote(1, -1, f'quote {i} ' + 'x' * 2000)
+        self.job.compact()  # first run switches to incremental auto_vacuum
+
+        with self.db.pool.connection() as conn:
+            conn.execute('DELETE FROM quotes')
+        self.assertGreater(self.freelist_count(), 1)
+
+        self.job.compact()
+        self.assertEqual(self.freelist_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+WELCOME_TEXT = """
+🤖 *PororokzBot* — многофункциональный Telegram-бот
+
+📝 *Цитаты:*
+/quote, /q — Создать цитату (тип 1)
+/quote2, /q2 — Создать цитату (тип 2, с emoji)
+/my_quote \\[номер\\], /m_q \\[номер\\] — Ваша цитата
+/her_quote \\[номер\\], /h_q \\[номер\\] — Цитата пользователя (ответ)
+/chat_quote \\[номер\\], /c_q \\[номер\\] — Цитата из чата
+/mchat_quote \\[номер\\], /mc_q \\[номер\\] — Ваша цитата из чата
+/all_quote — Случайная цитата
+/delete_quote ID, /d_q ID — Удалить цитату
+
+🎵 *Музыка:*
+/myz название — Найти и скачать музыку
+
+📷 *Фотографии:*
+/save_photo, /save_scan — Сохранить фото (ответ)
+/photos, /scans — Ваши сохранённые фото
+
+📱 *TikTok:*
+Просто отправьте ссылку на TikTok-видео для скачивания
+/tiktok — Случайное TikTok видео
+
+Используйте @PororokzBot в inline-режиме для цитат и фото в любом чате!
+@PororokzBot цитаты слово — поиск по вашим цитатам
+"""
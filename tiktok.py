@@ -1,98 +1,93 @@
-import os
-import re
 import logging
-import yt_dlp
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from database import Database
 from config import Config
+from media_jobs import MediaJobScheduler, QueueFull
+from extractors import ExtractorPool
+from media_pipeline import MediaPipeline
+from router import TIKTOK_URL_RE
+
 
 class TikTokManager:
     def __init__(self, bot):
         self.bot = bot
-        self.db = Database()
-        os.makedirs(Config.TIKTOK_DIR, exist_ok=True)
+        self.db = Database.shared()
         self._temp_urls = {}
+        self.jobs = MediaJobScheduler.shared(bot)
+        self.extractors = ExtractorPool.shared()
+        self.pipeline = MediaPipeline(self.extractors)
+
+    def _submit(self, user_id, chat_id, func, *args, status):
+        """Queue heavy yt-dlp work on the media scheduler"""
+        try:
+            self.jobs.submit(user_id, chat_id, func, *args, status=status)
+        except QueueFull:
+            self.bot.edit_message_text(
+                "⏳ Очередь загрузок переполнена, попробуйте позже.",
+                status.chat.id,
+                status.message_id
+            )
 
     def is_tiktok_url(self, text):
-        tiktok_patterns = [
-            r'https?://(?:www\.)?tiktok\.com/@[\w\.-]+/video/\d+',
-            r'https?://vm\.tiktok\.com/[\w\d]+',
-            r'https?://(?:www\.)?tiktok\.com/t/[\w\d]+',
-        ]
-        for pattern in tiktok_patterns:
-            if re.search(pattern, text):
-                return True
-        return False
+        return TIKTOK_URL_RE.search(text) is not None
 
     def extract_tiktok_url(self, text):
-        tiktok_patterns = [
-            r'https?://(?:www\.)?tiktok\.com/@[\w\.-]+/video/\d+',
-            r'https?://vm\.tiktok\.com/[\w\d]+',
-            r'https?://(?:www\.)?tiktok\.com/t/[\w\d]+',
-        ]
-        for pattern in tiktok_patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(0)
-        return None
+        match = TIKTOK_URL_RE.search(text)
+        return match.group(0) if match else None
 
     def download_tiktok_video(self, message, url):
         try:
             status_msg = self.bot.reply_to(message, "🔄 Обрабатываю TikTok видео...")
+            self._submit(message.from_user.id, message.chat.id, self._fetch_video_info, message, url, status_msg, status=status_msg)
+        except Exception as e:
+            logging.error(f"Error in download_tiktok_video: {e}")
+            self.bot.reply_to(message, "❌ Произошла ошибка при обработке TikTok!")
 
-            ydl_opts = {
-                'format': 'bestvideo[height<=720]+bestaudio/best',
-                'outtmpl': f'{Config.TIKTOK_DIR}/%(title)s.%(ext)s',
-                'quiet': True,
-                'no_warnings': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36',
-                'merge_output_format': 'mp4',
-            }
+    def _fetch_video_info(self, message, url, status_msg):
+        """Read video metadata and offer download options (runs on a media worker)
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        Returns the error text for the status message, or None once it shows the options.
+        """
+        try:
+            with self.extractors.acquire('tiktok-video') as ydl:
                 info = ydl.extract_info(url, download=False)
-                if not info:
-                    self.bot.edit_message_text(
-                        "❌ Не удалось получить информацию о видео!",
-                        message.chat.id,
-                        status_msg.message_id
-                    )
-                    return
-
-                title = info.get('title', 'TikTok Video')
-                uploader = info.get('uploader', 'Unknown')
-                duration = info.get('duration', 0)
-
-                keyboard = InlineKeyboardMarkup()
-                keyboard.row(
-                    InlineKeyboardButton("📹 Скачать видео", callback_data=f"download_video_{hash(url)}"),
-                    InlineKeyboardButton("🎵 Только звук", callback_data=f"download_audio_{hash(url)}")
-                )
+            if not info:
+                return "❌ Не удалось получить информацию о видео!"
 
-                video_info_text = (
-                    f"🎬 **{title}**\n"
-                    f"👤 Автор: {uploader}\n"
-                    f"⏱ Длительность: {duration}с\n\n"
-                    f"Выберите формат для скачивания:"
-                )
+            title = info.get('title', 'TikTok Video')
+            uploader = info.get('uploader', 'Unknown')
+            duration = info.get('duration', 0)
 
-                self.bot.edit_message_text(
-                    video_info_text,
-                    message.chat.id,
-                    status_msg.message_id,
-                    reply_markup=keyboard,
-                    parse_mode='Markdown'
-                )
+            keyboard = InlineKeyboardMarkup()
+            keyboard.row(
+                InlineKeyboardButton("📹 Скачать видео", callback_data=f"download_video_{hash(url)}"),
+                InlineKeyboardButton("🎵 Только звук", callback_data=f"download_audio_{hash(url)}")
+            )
+
+            video_info_text = (
+                f"🎬 **{title}**\n"
+                f"👤 Автор: {uploader}\n"
+                f"⏱ Длительность: {duration}с\n\n"
+                f"Выберите формат для скачивания:"
+            )
+
+            self.bot.edit_message_text(
+                video_info_text,
+                message.chat.id,
+                status_msg.message_id,
+                reply_markup=keyboard,
+                parse_mode='Markdown'
+            )
 
-                self._temp_urls[hash(url)] = {
-                    'url': url,
-                    'info': info,
-                    'user_id': message.from_user.id
-                }
+            self._temp_urls[hash(url)] = {
+                'url': url,
+                'info': info,
+                'user_id': message.from_user.id
+            }
 
         except Exception as e:
-            logging.error(f"Error in download_tiktok_video: {e}")
-            self.bot.reply_to(message, "❌ Произошла ошибка при обработке TikTok!")
+            logging.error(f"Error in _fetch_video_info: {e}")
+            return "❌ Произошла ошибка при обработке TikTok!"
 
     def handle_download_callback(self, call):
         try:
@@ -113,9 +108,9 @@ class TikTokManager:
             info = url_data['info']
 
             if download_type == 'video':
-                self._download_video_file(call, url, info)
+                self._submit(call.from_user.id, call.message.chat.id, self._download_video_file, call, url, info, status=call.message)
             elif download_type == 'audio':
-                self._download_audio_file(call, url, info)
+                self._submit(call.from_user.id, call.message.chat.id, self._download_audio_file, call, url, info, status=call.message)
             else:
                 self.bot.answer_callback_query(call.id, "❌ Неизвестный тип загрузки!")
 
@@ -131,49 +126,19 @@ class TikTokManager:
                 call.message.message_id
             )
 
-            ydl_opts = {
-                'format': 'bestvideo[height<=720]+bestaudio/best',
-                'outtmpl': f'{Config.TIKTOK_DIR}/%(title)s.%(ext)s',
-                'quiet': True,
-                'no_warnings': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36',
-                'merge_output_format': 'mp4',
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                filename = ydl.prepare_filename(info)
-
-                if os.path.exists(filename):
-                    with open(filename, 'rb') as video_file:
-                        self.bot.send_video(
-                            call.message.chat.id,
-                            video_file,
-                            caption=f"🎬 {info.get('title', 'TikTok Video')}"
-                        )
-                    self.bot.edit_message_text(
-                        "✅ Видео скачано!",
-                        call.message.chat.id,
-                        call.message.message_id
-                    )
-                    try:
-                        os.remove(filename)
-                    except Exception:
-                        pass
-                else:
-                    self.bot.edit_message_text(
-                        "❌ Ошибка при скачивании видео!",
-                        call.message.chat.id,
-                        call.message.message_id
-                    )
+            # The info from the options menu: no second extraction
+            with self.pipeline.open(url, 'tiktok-video', 'video',
+                                    resolved=self.pipeline.reuse(info, 'tiktok-video')) as media:
+                self.bot.send_video(
+                    call.message.chat.id,
+                    media.upload,
+                    caption=f"🎬 {info.get('title', 'TikTok Video')}"
+                )
+            return "✅ Видео скачано!"
 
         except Exception as e:
             logging.error(f"Error downloading video: {e}")
-            self.bot.edit_message_text(
-                "❌ Ошибка при скачивании видео!",
-                call.message.chat.id,
-                call.message.message_id
-            )
+            return "❌ Ошибка при скачивании видео!"
 
     def _download_audio_file(self, call, url, info):
         try:
@@ -183,54 +148,18 @@ class TikTokManager:
                 call.message.message_id
             )
 
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': f'{Config.TIKTOK_DIR}/%(title)s.%(ext)s',
-                'quiet': True,
-                'no_warnings': True,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-            }
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                filename = ydl.prepare_filename(info)
-                audio_filename = os.path.splitext(filename)[0] + '.mp3'
-
-                if os.path.exists(audio_filename):
-                    with open(audio_filename, 'rb') as audio_file:
-                        self.bot.send_audio(
-                            call.message.chat.id,
-                            audio_file,
-                            title=info.get('title', 'TikTok Audio')
-                        )
-                    self.bot.edit_message_text(
-                        "✅ Звук извлечен!",
-                        call.message.chat.id,
-                        call.message.message_id
-                    )
-                    try:
-                        os.remove(audio_filename)
-                    except Exception:
-                        pass
-                else:
-                    self.bot.edit_message_text(
-                        "❌ Ошибка при извлечении звука!",
-                        call.message.chat.id,
-                        call.message.message_id
-                    )
+            with self.pipeline.open(url, 'tiktok-audio', 'audio', mp3=Config.TIKTOK_AUDIO_MODE == 'mp3',
+                                    resolved=self.pipeline.reuse(info, 'tiktok-audio')) as media:
+                self.bot.send_audio(
+                    call.message.chat.id,
+                    media.upload,
+                    title=info.get('title', 'TikTok Audio')
+                )
+            return "✅ Звук извлечен!"
 
         except Exception as e:
             logging.error(f"Error downloading audio: {e}")
-            self.bot.edit_message_text(
-                "❌ Ошибка при извлечении звука!",
-                call.message.chat.id,
-                call.message.message_id
-            )
+            return "❌ Ошибка при извлечении звука!"
 
     def get_random_tiktok(self, message):
         try:
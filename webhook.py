@@ -0,0 +1,105 @@
+import hmac
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import Config
+
+# Telegram updates are small; anything bigger is not from Telegram
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class WebhookServer:
+    """Embedded HTTP server that receives Telegram updates by webhook
+
+    POST <path>  — an update; checked against the secret token header
+    GET /health  — liveness probe for the hosting platform
+    """
+
+    def __init__(self, dispatch, secret, path=None, host=None, port=None):
+        self.dispatch = dispatch  # called with the decoded update dict
+        self.secret = secret
+        self.path = path or Config.WEBHOOK_PATH
+        self.started_at = time.time()
+        self.updates = 0
+        self.rejected = 0
+        self._httpd = ThreadingHTTPServer(
+            (host or Config.WEBHOOK_HOST, port if port is not None else Config.PORT),
+            self._make_handler()
+        )
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='webhook', daemon=True)
+        self._thread.start()
+        logging.info(f"Webhook server listening on port {self.port}")
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/health':
+                    self._reply(404, {'ok': False})
+                    return
+                self._reply(200, {
+                    'ok': True,
+                    'uptime': round(time.time() - server.started_at),
+                    'updates': server.updates,
+                })
+
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404, {'ok': False})
+                    return
+
+                token = self.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+                if not hmac.compare_digest(token, server.secret):
+                    server.rejected += 1
+                    self._reply(403, {'ok': False})
+                    return
+
+                length = int(self.headers.get('Content-Length') or 0)
+                if length <= 0 or length > MAX_BODY_BYTES:
+                    self._reply(413 if length else 400, {'ok': False})
+                    return
+
+                try:
+                    update = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._reply(400, {'ok': False})
+                    return
+
+                try:
+                    server.dispatch(update)
+                    server.updates += 1
+                except Exception as e:
+                    # Still answer 200: a non-2xx makes Telegram redeliver the same update
+                    logging.error(f"Error dispatching webhook update: {e}")
+                self._reply(200, {'ok': True})
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logging.debug(f"webhook: {format % args}")
+
+        return Handler
@@ -0,0 +1,112 @@
+import sqlite3
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config import Config
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """Background writer that group-commits queued inserts in one transaction"""
+
+    def __init__(self, pool, batch_size=None, flush_interval=None):
+        self.pool = pool
+        self.batch_size = batch_size or Config.DB_WRITE_BATCH_SIZE
+        self.flush_interval = (flush_interval if flush_interval is not None
+                               else Config.DB_WRITE_FLUSH_MS / 1000)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params):
+        """Queue an INSERT; the returned future resolves to its row id"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Write-behind queue is closed")
+            self._queue.put((sql, params, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed"""
+        barrier = self.submit(None, None)
+        barrier.result(timeout)
+
+    def close(self):
+        """Commit pending writes and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            # Everything that queued up while the previous commit was running
+            # goes into this one; optionally linger a little to grow the batch
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+        """Write one batch; a failing row is rolled back alone via a savepoint"""
+        results = []
+        running = {future for _, _, future in batch if future.set_running_or_notify_cancel()}
+
+        try:
+            with self.pool.connection() as conn:
+                conn.execute('BEGIN')
+                for sql, params, future in batch:
+                    if future not in running:
+                        continue
+                    if sql is None:
+                        # flush() barrier: resolves once this batch is committed
+                        results.append((future, None))
+                        continue
+
+                    conn.execute('SAVEPOINT write_behind_row')
+                    try:
+                        cursor = conn.execute(sql, params)
+                        conn.execute('RELEASE write_behind_row')
+                        results.append((future, cursor.lastrowid))
+                    except sqlite3.Error as e:
+                        conn.execute('ROLLBACK TO write_behind_row')
+                        conn.execute('RELEASE write_behind_row')
+                        results.append((future, e))
+        except sqlite3.Error as e:
+            logging.error(f"Write-behind batch of {len(batch)} failed: {e}")
+            for future in running:
+                future.set_exception(e)
+            return
+
+        for future, result in results:
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)